@@ -1,119 +1,1667 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 from datetime import date, datetime
 from fpdf import FPDF
 from io import BytesIO
 import pdfplumber
 from ofxparse import OfxParser
+import openpyxl
 import re
+import csv
+import unicodedata
+import os
+import queue
+import sqlite3
+import threading
+import hashlib
+import hmac
+import secrets
+import html
+import json
+import time
+import pickle
+import zipfile
+import zlib
+import tempfile
+import weakref
+from collections import OrderedDict, deque
+from bisect import bisect_left, bisect_right
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from functools import partial, wraps
 
 # ==============================================================================
 # CONFIGURAÇÃO INICIAL
 # ==============================================================================
-st.set_page_config(page_title="Tesouraria Centro Espírita", layout="wide", page_icon="🕊️")
-
 WHATSAPP_TESOUREIRO = "5595981136537"
 
-st.markdown("""
+# Um processo atende vários centros. Sem ?centro na URL vale o centro da implantação;
+# os demais só abrem com a chave de acesso do centro (?centro=codigo&chave=...).
+CENTRO_PADRAO = os.environ.get("TESOURARIA_CENTRO", "principal")
+# Chave de quem cadastra centros e gera links de acesso; vazia desliga essa área.
+CHAVE_ADMIN = os.environ.get("TESOURARIA_ADMIN_CHAVE", "")
+MAX_CENTROS_ATIVOS = int(os.environ.get("TESOURARIA_MAX_CENTROS", "32"))
+
+class Centro:
+    """Identidade de um centro: código (chave no banco e na URL), nome e contato impressos nos documentos."""
+    def __init__(self, codigo, nome="Centro Espírita", whatsapp=WHATSAPP_TESOUREIRO):
+        self.codigo = codigo
+        self.nome = nome
+        self.whatsapp = whatsapp
+
+    @property
+    def cabecalho(self):
+        return f"{self.nome} - Documento Financeiro"
+
+    def _chave(self):
+        return (self.codigo, self.nome, self.whatsapp)
+
+    def __eq__(self, outro):
+        return isinstance(outro, Centro) and self._chave() == outro._chave()
+
+    def __hash__(self):
+        return hash(self._chave())
+
+CSS_APP = """
 <style>
     .big-font {font-size:20px !important; color: #2E7D32;}
     .metric-card {background-color: #f0f2f6; border-radius: 10px; padding: 15px; margin-bottom: 10px;}
     .stButton>button {width: 100%;}
 </style>
-""", unsafe_allow_html=True)
+"""
 
 # ==============================================================================
-# ESTADO DA APLICAÇÃO
+# LIVRO DE LANÇAMENTOS
 # ==============================================================================
-def init_session():
-    if 'financeiro' not in st.session_state:
-        st.session_state['financeiro'] = pd.DataFrame(columns=[
-            "ID", "Data", "Tipo", "Conta", "Categoria", "Centro_Custo", "Descrição", "Valor", "Socio", "Conciliado"
-        ])
+# Ref_Extrato guarda o FITID (ou a impressão digital) da linha de extrato que originou ou confirmou o lançamento.
+COLUNAS_FINANCEIRO = ["ID", "Data", "Tipo", "Conta", "Categoria", "Centro_Custo", "Descrição", "Valor", "Socio", "Conciliado", "Ref_Extrato"]
+
+RE_DATA_ISO = re.compile(r'\d{4}-\d{2}-\d{2}')
+
+def _data_iso(valor):
+    """Normaliza a data para 'AAAA-MM-DD', o formato indexado no banco."""
+    if isinstance(valor, date):
+        return valor.strftime('%Y-%m-%d')
+    if valor is None or (isinstance(valor, float) and pd.isna(valor)):
+        return None
+    if isinstance(valor, str) and RE_DATA_ISO.match(valor):
+        return valor[:10]
+    try:
+        return pd.to_datetime(valor, dayfirst=True).strftime('%Y-%m-%d')
+    except (ValueError, TypeError):
+        return str(valor)
+
+def _converter_datas(serie):
+    """Versão vetorizada de _data_iso: datas ISO ou dd/mm/aaaa -> datetime64 (NaT se inválida)."""
+    texto = serie.astype(str)
+    iso = texto.str.match(RE_DATA_ISO.pattern)
+    datas = pd.to_datetime(texto.where(iso).str[:10], format='%Y-%m-%d', errors='coerce')
+    if not iso.all():
+        outras = pd.to_datetime(texto.where(~iso), errors='coerce', dayfirst=True, format='mixed')
+        datas = datas.fillna(outras)
+    return datas
+
+def _texto(v):
+    return "" if v is None or (not isinstance(v, str) and pd.isna(v)) else str(v)
+
+def _mes(valor):
+    iso = _data_iso(valor)
+    return iso[:7] if iso and RE_DATA_ISO.match(iso) else ""
+
+# ------------------------------------------------------------------------------
+# Fechamento de períodos
+# ------------------------------------------------------------------------------
+# Fechar um mês grava os totais dele (no formato de SaldosAgregados) e bloqueia
+# os lançamentos com data até o fim desse mês. Meses são sempre 'AAAA-MM' e o
+# fechamento é cumulativo: o livro fica "fechado até" o último mês fechado.
+def _mes_br(mes):
+    return f"{mes[5:7]}/{mes[:4]}" if mes else ""
+
+def _proximo_mes(mes):
+    return (pd.Period(mes, freq='M') + 1).strftime('%Y-%m')
+
+def _meses_entre(inicio, fim):
+    return list(pd.period_range(inicio, fim, freq='M').strftime('%Y-%m'))
+
+def _validar_fechamento(mes, fechado_ate):
+    if not re.fullmatch(r'\d{4}-\d{2}', mes or ""):
+        raise ValueError("Mês inválido: use AAAA-MM.")
+    if mes <= fechado_ate:
+        raise ValueError(f"O livro já está fechado até {_mes_br(fechado_ate)}.")
+    if mes >= date.today().strftime('%Y-%m'):
+        raise ValueError("Só meses já encerrados podem ser fechados.")
+
+def _conferir_aberto(registros, fechado_ate):
+    """ValueError se algum dos lançamentos cair num mês fechado."""
+    if not fechado_ate:
+        return
+    for r in registros:
+        mes = _mes(r.get("Data"))
+        if mes and mes <= fechado_ate:
+            raise ValueError(f"O lançamento de {_data_iso(r.get('Data'))} está em período fechado "
+                                 f"(livro fechado até {_mes_br(fechado_ate)}). Reabra o mês para alterá-lo.")
+
+class SaldosAgregados:
+    """Totais corridos de Valor por (Conta, Tipo, Centro_Custo, Categoria, mês).
+
+    É atualizado a cada inclusão, edição ou exclusão no livro, de modo que o
+    Dashboard e o Balancete leem seus números sem varrer os lançamentos.
+    """
+    CHAVE = ["Conta", "Tipo", "Centro_Custo", "Categoria", "Mes"]
+
+    def __init__(self):
+        self._trava = threading.Lock()
+        self._totais = {}       # chave completa -> [soma, quantidade]
+        self._conta_tipo = {}   # (Conta, Tipo) -> soma
+        self._tipo = {}         # Tipo -> soma
+        self.quantidade = 0
+
+    def _somar(self, chave, valor, qtd):
+        item = self._totais.setdefault(chave, [0.0, 0])
+        item[0] += valor
+        item[1] += qtd
+        if item[1] <= 0:
+            del self._totais[chave]
+        conta, tipo = chave[0], chave[1]
+        self._conta_tipo[(conta, tipo)] = self._conta_tipo.get((conta, tipo), 0.0) + valor
+        self._tipo[tipo] = self._tipo.get(tipo, 0.0) + valor
+        self.quantidade += qtd
+
+    def registrar(self, registros, sinal=1):
+        """Soma (sinal=1) ou retira (sinal=-1) lançamentos dos totais."""
+        with self._trava:
+            for r in registros:
+                chave = (_texto(r.get("Conta")), _texto(r.get("Tipo")), _texto(r.get("Centro_Custo")),
+                         _texto(r.get("Categoria")), _mes(r.get("Data")))
+                valor = r.get("Valor")
+                valor = 0.0 if valor is None or pd.isna(valor) else float(valor)
+                self._somar(chave, sinal * valor, sinal)
+
+    def total(self, tipo, conta=None):
+        if conta is None:
+            return self._tipo.get(tipo, 0.0)
+        return self._conta_tipo.get((conta, tipo), 0.0)
+
+    COLUNAS = CHAVE + ["Valor", "Quantidade"]
+
+    def tabela(self):
+        """Totais atuais como DataFrame (colunas CHAVE + Valor, Quantidade)."""
+        with self._trava:
+            itens = [(*chave, soma, qtd) for chave, (soma, qtd) in self._totais.items()]
+        return pd.DataFrame(itens, columns=self.COLUNAS)
+
+    @classmethod
+    def de_totais(cls, df_totais):
+        """Monta a estrutura a partir de totais já agrupados (colunas CHAVE + Valor, Quantidade)."""
+        saldos = cls()
+        for r in df_totais.itertuples(index=False):
+            saldos._somar(tuple(r[:5]), float(r[5]), int(r[6]))
+        return saldos
+
+    @classmethod
+    def reconstruir(cls, df):
+        """Recalcula tudo de uma vez com groupby vetorizado sobre o livro."""
+        chaves = pd.DataFrame({c: df[c].fillna("").astype(str) for c in cls.CHAVE[:4]})
+        datas = _converter_datas(df['Data'])
+        chaves['Mes'] = datas.dt.strftime('%Y-%m').fillna("")
+        chaves['Valor'] = pd.to_numeric(df['Valor'], errors='coerce').fillna(0.0).astype(float)
+        agrupado = chaves.groupby(cls.CHAVE, sort=False).agg(Valor=('Valor', 'sum'), Quantidade=('Valor', 'size')).reset_index()
+        return cls.de_totais(agrupado)
+
+    def confere_com(self, df, tolerancia=0.005):
+        """Compara os totais corridos com uma reconstrução completa do livro."""
+        atual = self.tabela().set_index(self.CHAVE).sort_index()
+        refeito = self.reconstruir(df).tabela().set_index(self.CHAVE).sort_index()
+        if not atual.index.equals(refeito.index):
+            return False
+        return bool(((atual['Valor'] - refeito['Valor']).abs() <= tolerancia).all()
+                    and (atual['Quantidade'] == refeito['Quantidade']).all())
+
+class LivroCaixa:
+    """Livro de lançamentos guardado em colunas, com inserção amortizada O(1).
+
+    Cada coluna é uma lista que só cresce no final; o DataFrame usado pelas
+    telas (relatórios, st.data_editor) é montado sob demanda e reaproveitado
+    até a próxima escrita, em vez de copiar o livro inteiro a cada lançamento.
+    """
+    def __init__(self, df=None):
+        self._colunas = {c: [] for c in COLUNAS_FINANCEIRO}
+        self._posicao = {}  # ID -> índice nas listas
+        self._proximo_id = 1
+        self._df = None
+        self.versao = 0
+        self.saldos = SaldosAgregados()
+        self._relatorios = None
+        self.fechado_ate = ""
+        self._fechamentos = {}  # mês fechado -> momento do fechamento
+        self._saldos_fechados = pd.DataFrame(columns=SaldosAgregados.COLUNAS)
+        if df is not None and not df.empty:
+            self.append_many(df)
+
+    @property
+    def relatorios(self):
+        if self._relatorios is None: self._relatorios = MotorRelatorios(self)
+        return self._relatorios
+
+    def __len__(self):
+        return len(self._colunas["ID"])
+
+    @property
+    def empty(self):
+        return len(self) == 0
+
+    def _mudou(self):
+        self.versao += 1
+        self._df = None
+
+    def _registro(self, pos):
+        return {c: self._colunas[c][pos] for c in COLUNAS_FINANCEIRO}
+
+    def append(self, registro):
+        return self.append_many([registro])[0]
+
+    def append_many(self, registros):
+        """Acrescenta vários lançamentos de uma vez e devolve os IDs atribuídos."""
+        if isinstance(registros, pd.DataFrame):
+            registros = registros.to_dict('records')
+        registros = list(registros)
+        _conferir_aberto(registros, self.fechado_ate)
+        ids, gravados = [], []
+        for r in registros:
+            id_ = r.get("ID")
+            if id_ is None or pd.isna(id_): id_ = self._proximo_id
+            id_ = int(id_)
+            self._proximo_id = max(self._proximo_id, id_ + 1)
+            self._posicao[id_] = len(self)
+            for c in COLUNAS_FINANCEIRO:
+                self._colunas[c].append(id_ if c == "ID" else r.get(c))
+            ids.append(id_)
+            gravados.append(self._registro(self._posicao[id_]))
+        if ids:
+            self.saldos.registrar(gravados)
+            self._mudou()
+        return ids
+
+    def atualizar(self, id_, campos):
+        """Altera os campos informados de um lançamento."""
+        self.atualizar_varios({id_: campos})
+
+    def atualizar_varios(self, alteracoes):
+        """Aplica {ID: {campo: valor}} de uma vez."""
+        if not alteracoes:
+            return
+        for id_, campos in alteracoes.items():
+            anterior = self._registro(self._posicao[int(id_)])
+            _conferir_aberto([anterior, {**anterior, **campos}], self.fechado_ate)
+        for id_, campos in alteracoes.items():
+            pos = self._posicao[int(id_)]
+            self.saldos.registrar([self._registro(pos)], sinal=-1)
+            for c, v in campos.items():
+                if c in self._colunas and c != "ID": self._colunas[c][pos] = v
+            self.saldos.registrar([self._registro(pos)])
+        self._mudou()
+
+    def remover(self, ids):
+        """Exclui lançamentos pelo ID."""
+        ids = {int(i) for i in ids if int(i) in self._posicao}
+        if not ids:
+            return
+        anteriores = [self._registro(self._posicao[i]) for i in ids]
+        _conferir_aberto(anteriores, self.fechado_ate)
+        self.saldos.registrar(anteriores, sinal=-1)
+        manter = [p for p, i in enumerate(self._colunas["ID"]) if i not in ids]
+        self._colunas = {c: [v[p] for p in manter] for c, v in self._colunas.items()}
+        self._posicao = {i: p for p, i in enumerate(self._colunas["ID"])}
+        self._mudou()
+
+    @property
+    def df(self):
+        """Visão em DataFrame do livro (somente leitura: não altere no lugar)."""
+        if self._df is None:
+            self._df = pd.DataFrame(self._colunas, columns=COLUNAS_FINANCEIRO)
+        return self._df
+
+    def consultar(self, inicio=None, fim=None, conta=None, tipo=None, socio=None):
+        """Lançamentos que atendem aos filtros informados (None = sem filtro)."""
+        df = self.df
+        mask = pd.Series(True, index=df.index)
+        if conta is not None: mask &= df['Conta'] == conta
+        if tipo is not None: mask &= df['Tipo'] == tipo
+        if socio is not None: mask &= df['Socio'] == socio
+        if inicio is None and fim is None:
+            return df.loc[mask]
+        datas = _converter_datas(df['Data'])
+        if inicio is not None: mask &= datas >= pd.Timestamp(inicio)
+        if fim is not None: mask &= datas <= pd.Timestamp(fim)
+        return df.loc[mask].assign(Data=datas[mask].dt.date)
+
+    def conferir_aberto(self, registros):
+        _conferir_aberto(registros, self.fechado_ate)
+
+    def fechar(self, mes):
+        """Fecha o livro até `mes` ('AAAA-MM'): guarda os totais dos meses fechados e bloqueia seus lançamentos."""
+        _validar_fechamento(mes, self.fechado_ate)
+        totais = self.saldos.tabela()
+        novos = totais[(totais['Mes'] != "") & (totais['Mes'] > self.fechado_ate) & (totais['Mes'] <= mes)]
+        inicio = _proximo_mes(self.fechado_ate) if self.fechado_ate else min(novos['Mes'], default=mes)
+        momento = datetime.now().isoformat(timespec='seconds')
+        self._fechamentos.update((m, momento) for m in _meses_entre(inicio, mes))
+        self._saldos_fechados = pd.concat([self._saldos_fechados, novos], ignore_index=True) if len(self._saldos_fechados) else novos.reset_index(drop=True)
+        self.fechado_ate = mes
+
+    def reabrir(self, mes):
+        """Desfaz o fechamento de `mes` e dos meses seguintes."""
+        self._fechamentos = {m: t for m, t in self._fechamentos.items() if m < mes}
+        self._saldos_fechados = self._saldos_fechados[self._saldos_fechados['Mes'] < mes].reset_index(drop=True)
+        self.fechado_ate = max(self._fechamentos, default="")
+
+    def fechamentos(self):
+        """Meses fechados (Mes, Momento), do mais antigo ao mais recente."""
+        return pd.DataFrame(sorted(self._fechamentos.items()), columns=["Mes", "Momento"])
+
+    def saldos_fechados(self):
+        """Totais gravados nos fechamentos (colunas de SaldosAgregados.COLUNAS)."""
+        return self._saldos_fechados.copy()
+
+# ==============================================================================
+# ARMAZENAMENTO PERSISTENTE (SQLITE)
+# ==============================================================================
+# Caminho do banco local; TESOURARIA_DB="" mantém o modo antigo, só em memória.
+ARQUIVO_BANCO = os.environ.get("TESOURARIA_DB", "tesouraria.db")
+
+ESQUEMA_CADASTROS = {
+    'socios': ["Nome", "Telefone", "Status", "Email"],
+    'config_contas': ["Nome"],
+    'config_categorias_receita': ["Nome"],
+    'config_categorias_despesa': ["Nome"],
+    'config_centros_custo': ["Nome"],
+    'config_regras': ["Padrão", "Tipo", "Conta", "Valor_Min", "Valor_Max", "Categoria", "Centro_Custo", "Socio"],
+}
+
+def _col_sql(nome):
+    return '"' + nome + '"'
+
+def _valor_sql(v):
+    if v is None: return None
+    if isinstance(v, float) and pd.isna(v): return None
+    if v is pd.NaT or v is pd.NA: return None
+    if isinstance(v, np.generic): return v.item()
+    return v
+
+# ------------------------------------------------------------------------------
+# Alterações de cadastro linha a linha
+# ------------------------------------------------------------------------------
+# Cada alteração é (acao, chave, antes, depois): acao em "editar"/"incluir"/"excluir",
+# chave é o índice da linha no DataFrame do cadastro (o rowid no SQLite) e
+# antes/depois são dicionários {coluna: valor} (None quando não se aplicam).
+def _completar_chaves(df, alteracoes, proxima=None):
+    """Descarta alterações de linhas que já não existem e numera as linhas incluídas (a partir de proxima)."""
+    if proxima is None:
+        proxima = max(int(df.index.max()) + 1, 1) if len(df) else 1
+    feitas = []
+    for acao, chave, antes, depois in alteracoes:
+        if acao == "incluir":
+            if chave is None:
+                chave, proxima = proxima, proxima + 1
+        elif chave not in df.index:
+            continue
+        feitas.append((acao, chave, antes, depois))
+    return feitas
+
+def aplicar_alteracoes_df(df, alteracoes):
+    """Cópia do cadastro com as alterações aplicadas (chaves já completadas)."""
+    df = df.copy()
+    for acao, chave, antes, depois in alteracoes:
+        if acao == "editar":
+            for coluna, valor in depois.items():
+                df.at[chave, coluna] = valor
+    excluir = [chave for acao, chave, _, _ in alteracoes if acao == "excluir"]
+    if excluir:
+        df = df.drop(index=excluir)
+    incluir = [(chave, depois) for acao, chave, _, depois in alteracoes if acao == "incluir"]
+    if incluir:
+        novas = pd.DataFrame([d for _, d in incluir], index=[k for k, _ in incluir], columns=df.columns).astype(df.dtypes.to_dict())
+        df = pd.concat([df, novas]).sort_index()
+    return df
+
+def _inverter_alteracoes(alteracoes):
+    """Alterações que desfazem as informadas, na ordem inversa."""
+    inverso = {"editar": "editar", "incluir": "excluir", "excluir": "incluir"}
+    return [(inverso[acao], chave, depois, antes) for acao, chave, antes, depois in reversed(alteracoes)]
+
+def _json_linha(valores):
+    if valores is None: return None
+    return json.dumps({c: _valor_sql(v) for c, v in valores.items()}, ensure_ascii=False, default=str)
+
+# Totais do livro no formato de SaldosAgregados, agrupados no banco; {filtro} restringe as linhas.
+RE_DATA_ISO_SQL = "'[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]*'"
+SQL_TOTAIS_LIVRO = (
+    "SELECT COALESCE(Conta, '') AS Conta, COALESCE(Tipo, '') AS Tipo, "
+    "COALESCE(Centro_Custo, '') AS Centro_Custo, COALESCE(Categoria, '') AS Categoria, "
+    f"CASE WHEN Data GLOB {RE_DATA_ISO_SQL} THEN substr(Data, 1, 7) ELSE '' END AS Mes, "
+    "COALESCE(SUM(Valor), 0) AS Valor, COUNT(*) AS Quantidade "
+    "FROM financeiro WHERE Centro = ? {filtro} GROUP BY 1, 2, 3, 4, 5"
+)
+# Lançamentos sem data válida nunca entram num fechamento; o índice parcial abaixo os acha sem varrer o livro.
+SQL_DATA_INVALIDA = f"(Data IS NULL OR NOT Data GLOB {RE_DATA_ISO_SQL})"
+
+COLUNAS_AUDITORIA = ["Lote", "Momento", "Tabela", "Acao", "Chave", "Antes", "Depois", "Desfaz", "Desfeito"]
+
+class BancoTesouraria:
+    """Arquivo SQLite (modo WAL) compartilhado por todas as sessões do processo.
+
+    As escritas passam por uma única conexão protegida por trava; as leituras
+    usam um pequeno pool de conexões, que no WAL não bloqueiam a escrita.
+    """
+    def __init__(self, caminho, max_leitores=4):
+        self.caminho = caminho
+        self._trava = threading.RLock()  # reentrante: tabela() também a usa dentro de transações
+        self._escrita = self._conectar()
+        self._leitores = queue.LifoQueue()
+        self._max_leitores = max_leitores
+        self._cache_tabelas = {}
+        self._versoes_tabelas = {}  # (centro, nome) -> nº de escritas; protege o cache de leituras atrasadas
+        self._criar_esquema()
+
+    def _conectar(self):
+        con = sqlite3.connect(self.caminho, check_same_thread=False, timeout=30)
+        con.execute("PRAGMA journal_mode=WAL")
+        con.execute("PRAGMA synchronous=NORMAL")
+        return con
+
+    @contextmanager
+    def leitura(self):
+        try:
+            con = self._leitores.get_nowait()
+        except queue.Empty:
+            con = self._conectar()
+        try:
+            yield con
+        finally:
+            if self._leitores.qsize() < self._max_leitores: self._leitores.put(con)
+            else: con.close()
+
+    @contextmanager
+    def transacao(self):
+        """Bloco atômico de escrita: commit no fim ou rollback em caso de erro."""
+        with self._trava:
+            with self._escrita:
+                yield self._escrita
+
+    def _criar_esquema(self):
+        with self.transacao() as con:
+            versao_esquema = con.execute("PRAGMA user_version").fetchone()[0]
+            con.execute(
+                "CREATE TABLE IF NOT EXISTS financeiro (ID INTEGER PRIMARY KEY, Data TEXT, Tipo TEXT, Conta TEXT, "
+                'Categoria TEXT, Centro_Custo TEXT, "Descrição" TEXT, Valor REAL, Socio TEXT, Conciliado TEXT, Ref_Extrato TEXT, Centro TEXT)'
+            )
+            colunas_existentes = {linha[1] for linha in con.execute("PRAGMA table_info(financeiro)")}
+            if "Ref_Extrato" not in colunas_existentes:
+                con.execute("ALTER TABLE financeiro ADD COLUMN Ref_Extrato TEXT")
+            self._adicionar_centro(con, "financeiro")
+            for nome, colunas in ESQUEMA_CADASTROS.items():
+                con.execute(f"CREATE TABLE IF NOT EXISTS {nome} ({', '.join(_col_sql(c) + ' TEXT' for c in colunas)}, Centro TEXT)")
+                self._adicionar_centro(con, nome)
+                con.execute(f"CREATE INDEX IF NOT EXISTS idx_{nome}_centro ON {nome} (Centro)")
+            con.execute(
+                "CREATE TABLE IF NOT EXISTS auditoria_cadastros (Lote INTEGER, Momento TEXT, Tabela TEXT, Acao TEXT, "
+                "Chave INTEGER, Antes TEXT, Depois TEXT, Desfaz INTEGER, Desfeito INTEGER DEFAULT 0, Centro TEXT)"
+            )
+            self._adicionar_centro(con, "auditoria_cadastros")
+            con.execute("CREATE TABLE IF NOT EXISTS centros (Codigo TEXT PRIMARY KEY, Nome TEXT, WhatsApp TEXT)")
+            if "Chave" not in {linha[1] for linha in con.execute("PRAGMA table_info(centros)")}:
+                # Só o hash da chave de acesso; centros antigos ficam sem chave até o administrador gerar uma.
+                con.execute("ALTER TABLE centros ADD COLUMN Chave TEXT")
+            # Fechamentos: um registro por mês fechado e os totais desses meses no formato de SaldosAgregados.
+            con.execute("CREATE TABLE IF NOT EXISTS fechamentos (Centro TEXT, Mes TEXT, Momento TEXT, PRIMARY KEY (Centro, Mes))")
+            con.execute(
+                "CREATE TABLE IF NOT EXISTS saldos_fechados (Centro TEXT, Mes TEXT, Conta TEXT, Tipo TEXT, "
+                "Centro_Custo TEXT, Categoria TEXT, Valor REAL, Quantidade INTEGER)"
+            )
+            con.execute("CREATE INDEX IF NOT EXISTS idx_saldos_fechados_centro ON saldos_fechados (Centro, Mes)")
+            # Os índices começam pelo centro: toda consulta é de um centro só.
+            for antigo in ("idx_financeiro_data", "idx_financeiro_conta", "idx_financeiro_tipo", "idx_financeiro_socio",
+                           "idx_financeiro_ref", "idx_socios_nome", "idx_auditoria_tabela"):
+                con.execute(f"DROP INDEX IF EXISTS {antigo}")
+            con.execute("CREATE INDEX IF NOT EXISTS idx_financeiro_centro_data ON financeiro (Centro, Data)")
+            con.execute("CREATE INDEX IF NOT EXISTS idx_financeiro_centro_conta ON financeiro (Centro, Conta, Tipo)")
+            con.execute("CREATE INDEX IF NOT EXISTS idx_financeiro_centro_tipo ON financeiro (Centro, Tipo)")
+            con.execute("CREATE INDEX IF NOT EXISTS idx_financeiro_centro_socio ON financeiro (Centro, Socio)")
+            con.execute("CREATE INDEX IF NOT EXISTS idx_financeiro_centro_ref ON financeiro (Centro, Conta, Ref_Extrato)")
+            con.execute(f"CREATE INDEX IF NOT EXISTS idx_financeiro_centro_sem_data ON financeiro (Centro) WHERE {SQL_DATA_INVALIDA}")
+            con.execute("CREATE INDEX IF NOT EXISTS idx_socios_centro_nome ON socios (Centro, Nome)")
+            con.execute("CREATE INDEX IF NOT EXISTS idx_auditoria_centro ON auditoria_cadastros (Centro, Tabela, Lote)")
+            if versao_esquema == 0:
+                # Banco novo: grava os cadastros padrão uma única vez.
+                for nome, df in dados_iniciais().items():
+                    self._gravar_tabela(con, nome, df, CENTRO_PADRAO)
+            con.execute("INSERT OR IGNORE INTO centros (Codigo, Nome, WhatsApp) VALUES (?, ?, ?)",
+                        (CENTRO_PADRAO, "Centro Espírita", WHATSAPP_TESOUREIRO))
+            con.execute("PRAGMA user_version = 4")
+
+    def _adicionar_centro(self, con, tabela):
+        """Bancos anteriores ao modo multi-centro: as linhas existentes passam a ser do centro padrão."""
+        if "Centro" not in {linha[1] for linha in con.execute(f"PRAGMA table_info({tabela})")}:
+            con.execute(f"ALTER TABLE {tabela} ADD COLUMN Centro TEXT")
+            con.execute(f"UPDATE {tabela} SET Centro = ?", (CENTRO_PADRAO,))
+
+    def centro(self, codigo):
+        """Centro cadastrado com esse código (None se não existir)."""
+        with self.leitura() as con:
+            linha = con.execute("SELECT Codigo, Nome, WhatsApp FROM centros WHERE Codigo = ?", (codigo,)).fetchone()
+        return None if linha is None else Centro(*linha)
+
+    def centros(self):
+        with self.leitura() as con:
+            return [Centro(*linha) for linha in con.execute("SELECT Codigo, Nome, WhatsApp FROM centros ORDER BY Codigo")]
+
+    def conferir_chave(self, codigo, chave):
+        """A chave de acesso informada é a do centro?"""
+        with self.leitura() as con:
+            linha = con.execute("SELECT Chave FROM centros WHERE Codigo = ?", (codigo,)).fetchone()
+        if linha is None or not linha[0] or not chave:
+            return False
+        return hmac.compare_digest(linha[0], _hash_chave(chave))
+
+    def nova_chave(self, codigo):
+        """Gera e grava uma chave de acesso nova para o centro (a anterior deixa de valer); devolve a chave."""
+        chave = secrets.token_urlsafe(24)
+        with self.transacao() as con:
+            con.execute("UPDATE centros SET Chave = ? WHERE Codigo = ?", (_hash_chave(chave), codigo))
+        return chave
+
+    def salvar_centro(self, centro):
+        """Cadastra o centro (com os cadastros padrão) ou atualiza nome e contato de um existente."""
+        with self.transacao() as con:
+            existe = con.execute("SELECT 1 FROM centros WHERE Codigo = ?", (centro.codigo,)).fetchone()
+            if existe:
+                con.execute("UPDATE centros SET Nome = ?, WhatsApp = ? WHERE Codigo = ?", (centro.nome, centro.whatsapp, centro.codigo))
+                return
+            con.execute("INSERT INTO centros (Codigo, Nome, WhatsApp) VALUES (?, ?, ?)", (centro.codigo, centro.nome, centro.whatsapp))
+            for nome, df in dados_iniciais(centro).items():
+                self._gravar_tabela(con, nome, df, centro.codigo)
+
+    def esquecer_centro(self, centro):
+        """Tira da memória os cadastros em cache do centro."""
+        for chave in [c for c in self._cache_tabelas if c[0] == centro]:
+            self._cache_tabelas.pop(chave, None)
+
+    def _gravar_tabela(self, con, nome, df, centro):
+        colunas = ESQUEMA_CADASTROS[nome]
+        con.execute(f"DELETE FROM {nome} WHERE Centro = ?", (centro,))
+        linhas = [tuple(_valor_sql(r.get(c)) for c in colunas) + (centro,) for r in df.to_dict('records')]
+        con.executemany(
+            f"INSERT INTO {nome} ({', '.join(map(_col_sql, colunas))}, Centro) VALUES ({', '.join('?' * (len(colunas) + 1))})",
+            linhas
+        )
+        self._tabela_mudou(nome, centro)
+        self._cache_tabelas.pop((centro, nome), None)
+
+    def tabela(self, nome, centro=CENTRO_PADRAO):
+        """Cadastro do centro como DataFrame indexado pelo rowid; a mesma cópia serve a todas as sessões até ser alterada."""
+        df = self._cache_tabelas.get((centro, nome))
+        if df is None:
+            versao = self._versoes_tabelas.get((centro, nome), 0)
+            colunas = ESQUEMA_CADASTROS[nome]
+            with self.leitura() as con:
+                df = pd.read_sql_query(f"SELECT rowid, {', '.join(map(_col_sql, colunas))} FROM {nome} WHERE Centro = ? ORDER BY rowid",
+                                       con, params=(centro,), index_col="rowid")
+            df.index.name = None
+            # Só guarda se nenhuma escrita na tabela terminou durante a leitura (senão ela pode ser a versão antiga).
+            with self._trava:
+                if self._versoes_tabelas.get((centro, nome), 0) == versao:
+                    self._cache_tabelas[(centro, nome)] = df
+        return df
+
+    def _tabela_mudou(self, nome, centro):
+        """Chamado dentro da transação de escrita (com a trava)."""
+        self._versoes_tabelas[(centro, nome)] = self._versoes_tabelas.get((centro, nome), 0) + 1
+
+    def aplicar_alteracoes(self, nome, alteracoes, centro=CENTRO_PADRAO, desfaz=None):
+        """Grava só as linhas alteradas, numa transação, e registra o lote na auditoria.
+
+        Devolve o número do lote (None se nada mudou).
+        """
+        with self.transacao() as con:
+            atual = self.tabela(nome, centro)
+            # O rowid é único na tabela inteira, não só entre as linhas do centro.
+            proxima = con.execute(f"SELECT COALESCE(MAX(rowid), 0) + 1 FROM {nome}").fetchone()[0]
+            feitas = _completar_chaves(atual, alteracoes, proxima)
+            if not feitas:
+                return None
+            for acao, chave, antes, depois in feitas:
+                if acao == "editar":
+                    con.execute(f"UPDATE {nome} SET {', '.join(_col_sql(c) + ' = ?' for c in depois)} WHERE rowid = ? AND Centro = ?",
+                                [*map(_valor_sql, depois.values()), chave, centro])
+                elif acao == "excluir":
+                    con.execute(f"DELETE FROM {nome} WHERE rowid = ? AND Centro = ?", (chave, centro))
+                else:
+                    colunas = list(depois)
+                    con.execute(f"INSERT INTO {nome} (rowid, {', '.join(map(_col_sql, colunas))}, Centro) VALUES (?, {', '.join('?' * (len(colunas) + 1))})",
+                                [chave, *map(_valor_sql, depois.values()), centro])
+            lote = con.execute("SELECT COALESCE(MAX(Lote), 0) + 1 FROM auditoria_cadastros").fetchone()[0]
+            momento = datetime.now().isoformat(timespec='seconds')
+            con.executemany(
+                "INSERT INTO auditoria_cadastros (Lote, Momento, Tabela, Acao, Chave, Antes, Depois, Desfaz, Centro) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(lote, momento, nome, acao, chave, _json_linha(antes), _json_linha(depois), desfaz, centro) for acao, chave, antes, depois in feitas]
+            )
+            if desfaz is not None:
+                con.execute("UPDATE auditoria_cadastros SET Desfeito = 1 WHERE Lote = ?", (desfaz,))
+            self._tabela_mudou(nome, centro)
+            self._cache_tabelas[(centro, nome)] = aplicar_alteracoes_df(atual, feitas)
+            return lote
+
+    def desfazer(self, nome, centro=CENTRO_PADRAO):
+        """Reverte o último lote de alterações do cadastro que ainda não foi desfeito."""
+        with self.leitura() as con:
+            linhas = con.execute(
+                "SELECT Lote, Acao, Chave, Antes, Depois FROM auditoria_cadastros WHERE Lote = ("
+                "SELECT MAX(Lote) FROM auditoria_cadastros WHERE Centro = ? AND Tabela = ? AND Desfeito = 0 AND Desfaz IS NULL) ORDER BY rowid",
+                (centro, nome)
+            ).fetchall()
+        if not linhas:
+            return None
+        alteracoes = [(acao, chave, json.loads(antes) if antes else None, json.loads(depois) if depois else None)
+                      for _, acao, chave, antes, depois in linhas]
+        return self.aplicar_alteracoes(nome, _inverter_alteracoes(alteracoes), centro, desfaz=linhas[0][0])
+
+    def auditoria(self, nome, centro=CENTRO_PADRAO, limite=50):
+        with self.leitura() as con:
+            return pd.read_sql_query(
+                f"SELECT {', '.join(COLUNAS_AUDITORIA)} FROM auditoria_cadastros WHERE Centro = ? AND Tabela = ? ORDER BY rowid DESC LIMIT ?",
+                con, params=(centro, nome, limite)
+            )
+
+class LivroSQLite:
+    """Livro de lançamentos gravado no BancoTesouraria, com a mesma interface do LivroCaixa.
+
+    Uma instância por centro no processo (ver RecursosCentro): as páginas usam
+    consultar() para ler só as linhas de que precisam, apoiadas nos índices do banco.
+    """
+    def __init__(self, banco, centro=CENTRO_PADRAO):
+        self.banco = banco
+        self.centro = centro
+        self.versao = 0
+        self._df = None
+        self._df_versao = -1
+        self._saldos = None
+        self._trava_saldos = threading.Lock()
+        self._relatorios = None
+
+    @property
+    def relatorios(self):
+        if self._relatorios is None: self._relatorios = MotorRelatorios(self)
+        return self._relatorios
+
+    @property
+    def saldos(self):
+        """Totais corridos, mantidos a cada escrita.
 
-    if 'socios' not in st.session_state:
-        st.session_state['socios'] = pd.DataFrame({
+        Na primeira leitura vêm dos totais gravados nos fechamentos mais um
+        GROUP BY só dos lançamentos do período aberto.
+        """
+        with self._trava_saldos:
+            if self._saldos is not None:
+                return self._saldos
+            with self.banco.leitura() as con:
+                fechado = self._fechado_ate(con)
+                if fechado:
+                    # Período aberto: faixa de datas no índice (Centro, Data) + datas inválidas pelo índice parcial.
+                    abertura = _proximo_mes(fechado) + "-01"
+                    abertos = pd.read_sql_query(SQL_TOTAIS_LIVRO.format(filtro="AND Data >= ?"), con, params=(self.centro, abertura))
+                    sem_data = pd.read_sql_query(SQL_TOTAIS_LIVRO.format(filtro=f"AND {SQL_DATA_INVALIDA} AND (Data IS NULL OR Data < ?)"),
+                                                 con, params=(self.centro, abertura))
+                    totais = pd.concat([self._ler_saldos_fechados(con), abertos, sem_data], ignore_index=True)
+                else:
+                    totais = pd.read_sql_query(SQL_TOTAIS_LIVRO.format(filtro=""), con, params=(self.centro,))
+            self._saldos = SaldosAgregados.de_totais(totais)
+            return self._saldos
+
+    def _fechado_ate(self, con):
+        return con.execute("SELECT COALESCE(MAX(Mes), '') FROM fechamentos WHERE Centro = ?", (self.centro,)).fetchone()[0]
+
+    def _ler_saldos_fechados(self, con):
+        return pd.read_sql_query(f"SELECT {', '.join(SaldosAgregados.COLUNAS)} FROM saldos_fechados WHERE Centro = ? ORDER BY Mes",
+                                 con, params=(self.centro,))
+
+    @property
+    def fechado_ate(self):
+        """Último mês fechado ('AAAA-MM'; vazio se nenhum)."""
+        with self.banco.leitura() as con:
+            return self._fechado_ate(con)
+
+    def conferir_aberto(self, registros):
+        _conferir_aberto(registros, self.fechado_ate)
+
+    def fechar(self, mes):
+        """Fecha o livro até `mes` ('AAAA-MM'): grava os totais dos meses fechados e bloqueia seus lançamentos."""
+        with self.banco.transacao() as con:
+            fechado = self._fechado_ate(con)
+            _validar_fechamento(mes, fechado)
+            inicio = _proximo_mes(fechado) if fechado else ""
+            totais = pd.read_sql_query(SQL_TOTAIS_LIVRO.format(filtro=f"AND Data >= ? AND Data < ? AND Data GLOB {RE_DATA_ISO_SQL}"),
+                                       con, params=(self.centro, inicio and inicio + "-01", _proximo_mes(mes) + "-01"))
+            con.executemany(
+                f"INSERT INTO saldos_fechados (Centro, {', '.join(SaldosAgregados.COLUNAS)}) VALUES ({', '.join('?' * (len(SaldosAgregados.COLUNAS) + 1))})",
+                [(self.centro, *map(_valor_sql, linha)) for linha in totais[SaldosAgregados.COLUNAS].itertuples(index=False)]
+            )
+            momento = datetime.now().isoformat(timespec='seconds')
+            meses = _meses_entre(inicio or min(totais['Mes'], default=mes), mes)
+            con.executemany("INSERT INTO fechamentos (Centro, Mes, Momento) VALUES (?, ?, ?)", [(self.centro, m, momento) for m in meses])
+
+    def reabrir(self, mes):
+        """Desfaz o fechamento de `mes` e dos meses seguintes."""
+        with self.banco.transacao() as con:
+            con.execute("DELETE FROM saldos_fechados WHERE Centro = ? AND Mes >= ?", (self.centro, mes))
+            con.execute("DELETE FROM fechamentos WHERE Centro = ? AND Mes >= ?", (self.centro, mes))
+
+    def fechamentos(self):
+        """Meses fechados (Mes, Momento), do mais antigo ao mais recente."""
+        with self.banco.leitura() as con:
+            return pd.read_sql_query("SELECT Mes, Momento FROM fechamentos WHERE Centro = ? ORDER BY Mes", con, params=(self.centro,))
+
+    def saldos_fechados(self):
+        """Totais gravados nos fechamentos (colunas de SaldosAgregados.COLUNAS)."""
+        with self.banco.leitura() as con:
+            return self._ler_saldos_fechados(con)
+
+    def _registros(self, con, ids):
+        marcadores = ', '.join('?' * len(ids))
+        cur = con.execute(f"SELECT {', '.join(map(_col_sql, COLUNAS_FINANCEIRO))} FROM financeiro "
+                          f"WHERE Centro = ? AND ID IN ({marcadores})", [self.centro, *ids])
+        colunas = [d[0] for d in cur.description]
+        return [dict(zip(colunas, linha)) for linha in cur.fetchall()]
+
+    def __len__(self):
+        with self.banco.leitura() as con:
+            return con.execute("SELECT COUNT(*) FROM financeiro WHERE Centro = ?", (self.centro,)).fetchone()[0]
+
+    @property
+    def empty(self):
+        return len(self) == 0
+
+    def append(self, registro):
+        return self.append_many([registro])[0]
+
+    def append_many(self, registros):
+        """Grava vários lançamentos numa só transação e devolve os IDs atribuídos."""
+        if isinstance(registros, pd.DataFrame):
+            registros = registros.to_dict('records')
+        ids, linhas = [], []
+        with self.banco.transacao() as con:
+            fechado = self._fechado_ate(con)
+            proximo = con.execute("SELECT COALESCE(MAX(ID), 0) + 1 FROM financeiro").fetchone()[0]
+            for r in registros:
+                id_ = r.get("ID")
+                if id_ is None or pd.isna(id_): id_ = proximo
+                id_ = int(id_)
+                proximo = max(proximo, id_ + 1)
+                valor = _valor_sql(r.get("Valor"))
+                linhas.append((
+                    id_, _data_iso(r.get("Data")), r.get("Tipo"), r.get("Conta"), r.get("Categoria"),
+                    r.get("Centro_Custo"), r.get("Descrição"), None if valor is None else float(valor),
+                    r.get("Socio"), r.get("Conciliado"), _valor_sql(r.get("Ref_Extrato")), self.centro
+                ))
+                ids.append(id_)
+            gravados = [dict(zip(COLUNAS_FINANCEIRO, linha)) for linha in linhas]
+            _conferir_aberto(gravados, fechado)
+            con.executemany(
+                f"INSERT INTO financeiro ({', '.join(map(_col_sql, COLUNAS_FINANCEIRO))}, Centro) "
+                f"VALUES ({', '.join('?' * (len(COLUNAS_FINANCEIRO) + 1))})",
+                linhas
+            )
+            if ids:
+                self.saldos.registrar(gravados)
+        if ids:
+            self.versao += 1
+        return ids
+
+    def atualizar(self, id_, campos):
+        """Altera os campos informados de um lançamento."""
+        self.atualizar_varios({id_: campos})
+
+    def atualizar_varios(self, alteracoes):
+        """Aplica {ID: {campo: valor}} numa só transação."""
+        if not alteracoes:
+            return
+        with self.banco.transacao() as con:
+            fechado = self._fechado_ate(con)
+            pendentes = []
+            for id_, campos in alteracoes.items():
+                campos = {c: v for c, v in campos.items() if c in COLUNAS_FINANCEIRO and c != "ID"}
+                if "Data" in campos: campos["Data"] = _data_iso(campos["Data"])
+                if not campos:
+                    continue
+                anterior = self._registros(con, [int(id_)])
+                _conferir_aberto(anterior + [{**r, **campos} for r in anterior], fechado)
+                pendentes.append((id_, campos, anterior))
+            for id_, campos, anterior in pendentes:
+                con.execute(
+                    f"UPDATE financeiro SET {', '.join(_col_sql(c) + ' = ?' for c in campos)} WHERE ID = ? AND Centro = ?",
+                    [_valor_sql(v) for v in campos.values()] + [int(id_), self.centro]
+                )
+                self.saldos.registrar(anterior, sinal=-1)
+                self.saldos.registrar({**r, **campos} for r in anterior)
+        self.versao += 1
+
+    def remover(self, ids):
+        """Exclui lançamentos pelo ID."""
+        ids = [int(i) for i in ids]
+        if not ids:
+            return
+        with self.banco.transacao() as con:
+            anteriores = self._registros(con, ids)
+            _conferir_aberto(anteriores, self._fechado_ate(con))
+            con.executemany("DELETE FROM financeiro WHERE ID = ? AND Centro = ?", [(i, self.centro) for i in ids])
+            self.saldos.registrar(anteriores, sinal=-1)
+        self.versao += 1
+
+    def _ler(self, filtros=(), params=()):
+        where = " AND ".join(["Centro = ?", *filtros])
+        with self.banco.leitura() as con:
+            df = pd.read_sql_query(f"SELECT {', '.join(map(_col_sql, COLUNAS_FINANCEIRO))} FROM financeiro WHERE {where} ORDER BY ID",
+                                   con, params=[self.centro, *params])
+        df['Data'] = pd.to_datetime(df['Data'], errors='coerce').dt.date
+        return df
+
+    @property
+    def df(self):
+        """Visão completa do livro, relida só quando houve escrita."""
+        if self._df_versao != self.versao:
+            versao = self.versao
+            self._df = self._ler()
+            self._df_versao = versao
+        return self._df
+
+    def consultar(self, inicio=None, fim=None, conta=None, tipo=None, socio=None):
+        """Lançamentos que atendem aos filtros informados (None = sem filtro)."""
+        filtros, params = [], []
+        if inicio is not None: filtros.append("Data >= ?"); params.append(_data_iso(inicio))
+        if fim is not None: filtros.append("Data <= ?"); params.append(_data_iso(fim))
+        if conta is not None: filtros.append("Conta = ?"); params.append(conta)
+        if tipo is not None: filtros.append("Tipo = ?"); params.append(tipo)
+        if socio is not None: filtros.append("Socio = ?"); params.append(socio)
+        return self._ler(filtros, params)
+
+def _hash_chave(chave):
+    return hashlib.sha256(chave.encode()).hexdigest()
+
+@st.cache_resource
+def obter_banco(caminho):
+    return BancoTesouraria(caminho)
+
+
+# ==============================================================================
+# CACHE EM MEMÓRIA
+# ==============================================================================
+class CacheLRU:
+    """Dicionário limitado que descarta o item usado há mais tempo; conta acertos e falhas."""
+    def __init__(self, max_itens, ao_descartar=None):
+        self.max_itens = max_itens
+        self.ao_descartar = ao_descartar
+        self._itens = OrderedDict()
+        self._trava = threading.Lock()
+        self.acertos = 0
+        self.falhas = 0
+
+    def __len__(self):
+        return len(self._itens)
+
+    def __contains__(self, chave):
+        return chave in self._itens
+
+    def get(self, chave, padrao=None):
+        with self._trava:
+            if chave in self._itens:
+                self._itens.move_to_end(chave)
+                self.acertos += 1
+                return self._itens[chave]
+            self.falhas += 1
+            return padrao
+
+    def put(self, chave, valor):
+        with self._trava:
+            self._itens[chave] = valor
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.max_itens:
+                _, descartado = self._itens.popitem(last=False)
+                if self.ao_descartar: self.ao_descartar(descartado)
+
+    def valores(self):
+        with self._trava:
+            return list(self._itens.values())
+
+    def limpar(self):
+        with self._trava:
+            itens = list(self._itens.values())
+            self._itens.clear()
+        if self.ao_descartar:
+            for valor in itens: self.ao_descartar(valor)
+
+    def obter(self, chave, gerar):
+        """Valor em cache ou, na falta, gerar() guardado sob a chave."""
+        valor = self.get(chave, _AUSENTE)
+        if valor is _AUSENTE:
+            valor = gerar()
+            self.put(chave, valor)
+        return valor
+
+_AUSENTE = object()
+
+# ==============================================================================
+# DIAGNÓSTICO (INSTRUMENTAÇÃO)
+# ==============================================================================
+# Desligado por padrão; TESOURARIA_DIAGNOSTICO=1 liga a coleta desde o início e
+# mostra a página "Diagnóstico" (que também aparece com ?diagnostico=1 na URL).
+DIAGNOSTICO = os.environ.get("TESOURARIA_DIAGNOSTICO", "") not in ("", "0")
+
+class Rastreador:
+    """Guarda os últimos intervalos medidos (spans) do processo num buffer circular.
+
+    Cada span tem nome, início, duração, thread, o span pai (para os aninhados)
+    e atributos livres; rotular() acrescenta atributos ao span aberto.
+    """
+    def __init__(self, max_spans=5000, ativo=False):
+        self.ativo = ativo
+        self.spans = deque(maxlen=max_spans)
+        self._trava = threading.Lock()
+        self._local = threading.local()
+        self._proximo_id = 0
+
+    def _pilha(self):
+        pilha = getattr(self._local, 'pilha', None)
+        if pilha is None:
+            pilha = self._local.pilha = []
+        return pilha
+
+    @contextmanager
+    def medir(self, nome, **atributos):
+        if not self.ativo:
+            yield None
+            return
+        pilha = self._pilha()
+        with self._trava:
+            self._proximo_id += 1
+            span = {"id": self._proximo_id, "pai": pilha[-1]["id"] if pilha else None, "nome": nome,
+                    "thread": threading.get_ident(), "inicio": time.time(), "atributos": atributos}
+        pilha.append(span)
+        inicio = time.perf_counter()
+        try:
+            yield span
+        except BaseException as erro:
+            # st.rerun()/st.stop() também passam por aqui: registra o tipo e deixa seguir.
+            span["atributos"]["interrompido"] = type(erro).__name__
+            raise
+        finally:
+            span["duracao_ms"] = (time.perf_counter() - inicio) * 1000
+            pilha.pop()
+            with self._trava:
+                self.spans.append(span)
+
+    def rotular(self, **atributos):
+        pilha = self._pilha()
+        if self.ativo and pilha:
+            pilha[-1]["atributos"].update(atributos)
+
+    def limpar(self):
+        with self._trava:
+            self.spans.clear()
+
+    def tabela(self):
+        with self._trava:
+            spans = list(self.spans)
+        por_id = {s["id"]: s for s in spans}
+        def pagina(span):
+            # Só o span da execução inteira é rotulado com a página; os aninhados herdam.
+            while span is not None:
+                if "pagina" in span["atributos"]: return span["atributos"]["pagina"]
+                span = por_id.get(span["pai"])
+            return ""
+        linhas = [{"Nome": s["nome"], "Página": pagina(s), "Duração (ms)": s["duracao_ms"],
+                   "Início": datetime.fromtimestamp(s["inicio"]).strftime('%H:%M:%S.%f')[:-3],
+                   "Atributos": ", ".join(f"{k}={v}" for k, v in s["atributos"].items() if k != "pagina")}
+                  for s in spans]
+        return pd.DataFrame(linhas, columns=["Nome", "Página", "Duração (ms)", "Início", "Atributos"])
+
+    def trace_chrome(self):
+        """Spans no formato Trace Event (JSON) do chrome://tracing e do Perfetto."""
+        with self._trava:
+            spans = list(self.spans)
+        eventos = [{"name": s["nome"], "ph": "X", "ts": s["inicio"] * 1e6, "dur": s["duracao_ms"] * 1000,
+                    "pid": os.getpid(), "tid": s["thread"], "args": {k: str(v) for k, v in s["atributos"].items()}}
+                   for s in spans]
+        return json.dumps({"traceEvents": eventos, "displayTimeUnit": "ms"}, ensure_ascii=False).encode('utf-8')
+
+@st.cache_resource
+def obter_rastreador():
+    return Rastreador(ativo=DIAGNOSTICO)
+
+def medir(nome, **atributos):
+    return obter_rastreador().medir(nome, **atributos)
+
+def rastreado(nome):
+    """Decorador: mede cada chamada da função como um span."""
+    def decorar(funcao):
+        @wraps(funcao)
+        def medida(*args, **kwargs):
+            with medir(nome):
+                return funcao(*args, **kwargs)
+        return medida
+    return decorar
+
+class ContadorCache:
+    """Acertos e falhas de uma função do st.cache_data, que não os expõe.
+
+    chamar() passa pela função em cache; o corpo dela chama falhou(), que só
+    roda quando o valor não estava no cache. O span aberto recebe cache=hit|miss.
+    """
+    def __init__(self, max_itens):
+        self.max_itens = max_itens
+        self.acertos = 0
+        self.falhas = 0
+        self._trava = threading.Lock()
+        self._local = threading.local()
+
+    def falhou(self):
+        self._local.falhou = True
+
+    def chamar(self, funcao, *args):
+        self._local.falhou = False
+        try:
+            return funcao(*args)
+        finally:
+            falhou = self._local.falhou
+            with self._trava:
+                if falhou: self.falhas += 1
+                else: self.acertos += 1
+            obter_rastreador().rotular(cache="miss" if falhou else "hit")
+
+@st.cache_resource
+def obter_contadores_arquivos():
+    """Contadores dos caches de extratos lidos (por hash do conteúdo), comuns ao processo."""
+    return {"OFX": ContadorCache(32), "PDF": ContadorCache(32), "planilhas": ContadorCache(32)}
+
+def _memoria_df(df):
+    return df.memory_usage(deep=True).sum() / 2 ** 20
+
+def memoria_sessao():
+    """Tamanho em memória das tabelas da sessão (só as já carregadas: nada é lido do banco aqui)."""
+    linhas = []
+    for chave, valor in st.session_state.items():
+        tabelas = {}
+        if isinstance(valor, pd.DataFrame): tabelas[chave] = valor
+        elif isinstance(getattr(valor, '_df', None), pd.DataFrame): tabelas[chave] = valor._df
+        elif isinstance(valor, dict):
+            tabelas.update({f"{chave}.{k}": v for k, v in valor.items() if isinstance(v, pd.DataFrame)})
+        linhas += [{"Tabela": nome, "Linhas": len(df), "Memória (MB)": _memoria_df(df)} for nome, df in tabelas.items()]
+    return pd.DataFrame(linhas, columns=["Tabela", "Linhas", "Memória (MB)"]).sort_values("Memória (MB)", ascending=False)
+
+def estatisticas_caches():
+    """Acertos e falhas dos caches do processo (centros, recibos, extratos lidos) e dos relatórios da sessão."""
+    caches = [("centros ativos", obter_centros_ativos())]
+    caches += [(f"extratos {tipo}", contador) for tipo, contador in obter_contadores_arquivos().items()]
+    caches += [(f"recibos [{r.centro.codigo}]", r.recibos) for r in obter_centros_ativos().valores()]
+    motor = getattr(st.session_state.get('financeiro'), '_relatorios', None)
+    if motor is not None:
+        caches += [("relatórios: resumos", motor._resumos), ("relatórios: PDFs", motor._pdfs)]
+    # Os caches do st.cache_data não informam quantos itens guardam (ContadorCache não tem len).
+    linhas = [{"Cache": nome, "Itens": len(c) if hasattr(c, '__len__') else None, "Máximo": c.max_itens, "Acertos": c.acertos, "Falhas": c.falhas,
+               "Taxa de acerto": c.acertos / (c.acertos + c.falhas) if c.acertos + c.falhas else None}
+              for nome, c in caches]
+    return pd.DataFrame(linhas).astype({"Itens": "Int64"})
+
+# ==============================================================================
+# ESTADO DA APLICAÇÃO
+# ==============================================================================
+def dados_iniciais(centro=None):
+    """Cadastros padrão de uma tesouraria nova."""
+    whatsapp = centro.whatsapp if centro is not None else WHATSAPP_TESOUREIRO
+    return {
+        'socios': pd.DataFrame({
             "Nome": ["Joel Silva", "Maria Oliveira", "Doador Anônimo"],
-            "Telefone": [WHATSAPP_TESOUREIRO, "95988888888", ""],
+            "Telefone": [whatsapp, "95988888888", ""],
             "Status": ["Ativo", "Ativo", "N/A"],
             "Email": ["joel@email.com", "maria@email.com", ""]
-        })
+        }),
+        'config_contas': pd.DataFrame({"Nome": ["Conta Corrente (Banco)", "Caixa Físico (Espécie)"]}),
+        'config_categorias_receita': pd.DataFrame({"Nome": ["Doação Anônima", "Mensalidade", "Cantina", "Bazar", "Livros", "Eventos"]}),
+        'config_categorias_despesa': pd.DataFrame({"Nome": ["Energia", "Água", "Manutenção Predial", "Assistência Social", "Internet", "Material de Limpeza"]}),
+        'config_centros_custo': pd.DataFrame({"Nome": ["Geral", "Departamento Doutrinário", "Assistência Social", "Administrativo"]}),
+        'config_regras': pd.DataFrame({
+            "Padrão": ["/energia|luz/", "mensalidade"], "Tipo": ["Saída", "Entrada"], "Conta": ["", ""],
+            "Valor_Min": ["", ""], "Valor_Max": ["", ""], "Categoria": ["Energia", "Mensalidade"],
+            "Centro_Custo": ["Administrativo", ""], "Socio": ["", ""]
+        }),
+    }
 
-    if 'config_contas' not in st.session_state:
-        st.session_state['config_contas'] = pd.DataFrame({"Nome": ["Conta Corrente (Banco)", "Caixa Físico (Espécie)"]})
+class RecursosCentro:
+    """O que um centro mantém na memória do processo: livro e índice de sócios (modo banco), modelos e cache de recibos."""
+    def __init__(self, centro):
+        self.centro = centro
+        self.recibos = CacheLRU(500)
+        self._modelos = {}
+        self._livro = None
+        self.indice_socios = IndiceSocios()
+        self._trava = threading.Lock()
 
-    if 'config_categorias_receita' not in st.session_state:
-        st.session_state['config_categorias_receita'] = pd.DataFrame({"Nome": ["Doação Anônima", "Mensalidade", "Cantina", "Bazar", "Livros", "Eventos"]})
-    
-    if 'config_categorias_despesa' not in st.session_state:
-        st.session_state['config_categorias_despesa'] = pd.DataFrame({"Nome": ["Energia", "Água", "Manutenção Predial", "Assistência Social", "Internet", "Material de Limpeza"]})
+    def renomear(self, centro):
+        """Nome ou contato mudaram: os recibos prontos e os modelos carregam a identidade antiga."""
+        self.centro = centro
+        self.recibos = CacheLRU(500)
+        self._modelos = {}
+
+    def modelo_recibo(self, modelo):
+        fixo = self._modelos.get(modelo)
+        if fixo is None:
+            fixo = self._modelos[modelo] = _modelo_recibo(modelo, self.centro)
+        return fixo
+
+    @property
+    def livro(self):
+        with self._trava:
+            if self._livro is None:
+                self._livro = LivroSQLite(obter_banco(ARQUIVO_BANCO), self.centro.codigo)
+            return self._livro
+
+    def descartar(self):
+        if ARQUIVO_BANCO:
+            obter_banco(ARQUIVO_BANCO).esquecer_centro(self.centro.codigo)
+
+_TRAVA_CENTROS = threading.Lock()
+
+@st.cache_resource
+def obter_centros_ativos():
+    """Recursos dos centros usados há menos tempo; o mais antigo sai da memória ao passar do limite."""
+    return CacheLRU(MAX_CENTROS_ATIVOS, ao_descartar=RecursosCentro.descartar)
+
+def recursos_centro(centro=None):
+    centro = centro or Centro(CENTRO_PADRAO)
+    with _TRAVA_CENTROS:
+        recursos = obter_centros_ativos().obter(centro.codigo, lambda: RecursosCentro(centro))
+        if recursos.centro != centro:
+            recursos.renomear(centro)
+    return recursos
+
+def centro_da_sessao():
+    """Centro da implantação ou o pedido na URL com sua chave; None se não existir ou a chave não conferir.
+
+    Sem banco cada sessão tem seus próprios dados e não há o que proteger.
+    """
+    codigo = st.query_params.get("centro", CENTRO_PADRAO)
+    if not ARQUIVO_BANCO:
+        return Centro(codigo)
+    banco = obter_banco(ARQUIVO_BANCO)
+    if codigo != CENTRO_PADRAO and not banco.conferir_chave(codigo, st.query_params.get("chave", "")):
+        return None
+    return banco.centro(codigo)
+
+def sessao_admin():
+    """A sessão informou a chave de administrador (TESOURARIA_ADMIN_CHAVE)?"""
+    return bool(CHAVE_ADMIN) and hmac.compare_digest(st.session_state.get('chave_admin', ""), CHAVE_ADMIN)
+
+def link_centro(codigo, chave):
+    return f"?centro={codigo}&chave={chave}"
+
+def _codigo_centro():
+    return st.session_state['centro'].codigo
+
+def init_session():
+    centro = centro_da_sessao()
+    if centro is None:
+        st.error("Centro não cadastrado ou chave de acesso inválida. Confira o endereço recebido da administração.")
+        st.stop()
+    anterior = st.session_state.get('centro')
+    st.session_state['centro'] = centro
+
+    if ARQUIVO_BANCO:
+        # Nada é copiado para a sessão: livro e cadastros são objetos do processo, um conjunto por centro.
+        banco = obter_banco(ARQUIVO_BANCO)
+        st.session_state['financeiro'] = recursos_centro(centro).livro
+        for nome in ESQUEMA_CADASTROS:
+            st.session_state[nome] = banco.tabela(nome, centro.codigo)
+        return
+
+    if anterior is not None and anterior.codigo != centro.codigo:
+        # Modo memória: trocar de centro recomeça a sessão com os dados do novo centro.
+        for chave in ['financeiro', 'auditoria_cadastros', 'indice_socios', 'importacao', 'extrato_lido', *ESQUEMA_CADASTROS]:
+            st.session_state.pop(chave, None)
+
+    if 'financeiro' not in st.session_state:
+        st.session_state['financeiro'] = LivroCaixa()
+
+    faltando = [nome for nome in ESQUEMA_CADASTROS if nome not in st.session_state]
+    if faltando:
+        iniciais = dados_iniciais(centro)
+        for nome in faltando:
+            st.session_state[nome] = iniciais[nome]
+
+def alterar_cadastro(nome, alteracoes, desfaz=None):
+    """Aplica alterações linha a linha ao cadastro (banco ou sessão) e as registra na auditoria."""
+    if ARQUIVO_BANCO:
+        lote = obter_banco(ARQUIVO_BANCO).aplicar_alteracoes(nome, alteracoes, _codigo_centro(), desfaz)
+        st.session_state[nome] = obter_banco(ARQUIVO_BANCO).tabela(nome, _codigo_centro())
+        return lote
+    feitas = _completar_chaves(st.session_state[nome], alteracoes)
+    if not feitas:
+        return None
+    st.session_state[nome] = aplicar_alteracoes_df(st.session_state[nome], feitas)
+    log = st.session_state.setdefault('auditoria_cadastros', [])
+    lote = (log[-1]["Lote"] if log else 0) + 1
+    momento = datetime.now().isoformat(timespec='seconds')
+    log.extend({"Lote": lote, "Momento": momento, "Tabela": nome, "Acao": acao, "Chave": chave, "Antes": antes,
+                "Depois": depois, "Desfaz": desfaz, "Desfeito": 0} for acao, chave, antes, depois in feitas)
+    if desfaz is not None:
+        for registro in log:
+            if registro["Lote"] == desfaz: registro["Desfeito"] = 1
+    return lote
+
+def desfazer_cadastro(nome):
+    """Reverte o último lote de alterações do cadastro que ainda não foi desfeito."""
+    if ARQUIVO_BANCO:
+        lote = obter_banco(ARQUIVO_BANCO).desfazer(nome, _codigo_centro())
+        st.session_state[nome] = obter_banco(ARQUIVO_BANCO).tabela(nome, _codigo_centro())
+        return lote
+    log = st.session_state.get('auditoria_cadastros', [])
+    lotes = [r["Lote"] for r in log if r["Tabela"] == nome and not r["Desfeito"] and r["Desfaz"] is None]
+    if not lotes:
+        return None
+    alteracoes = [(r["Acao"], r["Chave"], r["Antes"], r["Depois"]) for r in log if r["Lote"] == lotes[-1]]
+    return alterar_cadastro(nome, _inverter_alteracoes(alteracoes), desfaz=lotes[-1])
+
+def auditoria_cadastro(nome, limite=50):
+    if ARQUIVO_BANCO:
+        return obter_banco(ARQUIVO_BANCO).auditoria(nome, _codigo_centro(), limite)
+    log = [r for r in st.session_state.get('auditoria_cadastros', []) if r["Tabela"] == nome][::-1][:limite]
+    return pd.DataFrame([{**r, "Antes": _json_linha(r["Antes"]), "Depois": _json_linha(r["Depois"])} for r in log],
+                        columns=COLUNAS_AUDITORIA)
+
+
+# ==============================================================================
+# ÍNDICE DE SÓCIOS
+# ==============================================================================
+class IndiceSocios:
+    """Buscas por nome de sócio: linha do cadastro, telefone só com dígitos e lançamentos no livro.
+
+    Os mapas por cadastro são refeitos só quando o DataFrame de sócios é
+    trocado (toda gravação gera um novo). No modo banco há um índice por
+    centro, compartilhado pelas sessões, e o histórico vem de uma consulta
+    indexada; em memória, de um mapa do livro refeito sob demanda.
+    """
+    def __init__(self):
+        self._trava = threading.Lock()
+        self._socios = None
+        self._livro = None
+        self._versao_livro = None
+        self.nomes = []
+        self.nomes_unicos = []
+        self._linhas = {}
+        self._telefones = {}
+        self._posicoes = None
+
+    def atualizar(self, socios, livro):
+        with self._trava:
+            self._atualizar(socios, livro)
+        return self
+
+    def _atualizar(self, socios, livro):
+        if socios is not self._socios:
+            self._socios = socios
+            self.nomes = socios['Nome'].tolist()
+            self.nomes_unicos = list(pd.unique(socios['Nome']))
+            digitos = socios['Telefone'].astype(str).str.replace(r'\D', '', regex=True).fillna('').tolist()
+            # Nome repetido: vale a primeira linha, como no filtro antigo.
+            self._linhas = {}
+            for pos, nome in enumerate(self.nomes):
+                self._linhas.setdefault(nome, pos)
+            self._telefones = {nome: digitos[pos] for nome, pos in self._linhas.items()}
+        if livro is not self._livro or livro.versao != self._versao_livro:
+            # O mapa do livro só é refeito quando o histórico for pedido.
+            self._livro, self._versao_livro = livro, livro.versao
+            self._posicoes = None
 
-    if 'config_centros_custo' not in st.session_state:
-        st.session_state['config_centros_custo'] = pd.DataFrame({"Nome": ["Geral", "Departamento Doutrinário", "Assistência Social", "Administrativo"]})
+    def _mapa_livro(self):
+        with self._trava:
+            if self._posicoes is None:
+                codigos, nomes = pd.factorize(self._livro.df['Socio'])
+                ordem = np.argsort(codigos, kind='stable')
+                limites = np.searchsorted(codigos[ordem], np.arange(len(nomes) + 1))
+                self._posicoes = {nome: ordem[limites[i]:limites[i + 1]] for i, nome in enumerate(nomes)}
+            return self._livro.df, self._posicoes
 
-init_session()
+    def linha(self, nome):
+        """Linha do sócio no cadastro (None se não existir)."""
+        pos = self._linhas.get(nome)
+        return None if pos is None else self._socios.iloc[pos]
+
+    def telefone(self, nome):
+        """Telefone do sócio só com dígitos ("" se não houver)."""
+        return self._telefones.get(nome, "")
+
+    def historico(self, nome):
+        """Lançamentos do sócio no livro, na ordem do livro."""
+        if ARQUIVO_BANCO:
+            # No banco a consulta usa o índice (Centro, Socio), sem carregar o livro inteiro.
+            return self._livro.consultar(socio=nome)
+        df, posicoes = self._mapa_livro()
+        pos = posicoes.get(nome)
+        return df.iloc[:0] if pos is None else df.iloc[pos]
+
+def indice_socios():
+    if ARQUIVO_BANCO:
+        # Cadastro e livro são os mesmos objetos para todas as sessões do centro; o índice também.
+        indice = recursos_centro(st.session_state['centro']).indice_socios
+    else:
+        indice = st.session_state.get('indice_socios')
+        if indice is None:
+            indice = st.session_state['indice_socios'] = IndiceSocios()
+    return indice.atualizar(st.session_state['socios'], st.session_state['financeiro'])
 
 # ==============================================================================
 # FUNÇÕES DE PDF (RECIBOS E RELATÓRIOS)
 # ==============================================================================
 class PDFReport(FPDF):
+    def __init__(self, centro=None):
+        super().__init__()
+        self.centro = centro or Centro(CENTRO_PADRAO)
+
     def header(self):
         self.set_font('Arial', 'B', 14)
-        self.cell(0, 10, 'Centro Espírita - Documento Financeiro', 0, 1, 'C')
+        self.cell(0, 10, self.centro.cabecalho, 0, 1, 'C')
         self.ln(5)
 
     def footer(self):
         self.set_y(-15)
         self.set_font('Arial', 'I', 8)
-        self.cell(0, 10, f'Tesouraria - Contato: +{WHATSAPP_TESOUREIRO} | Página ' + str(self.page_no()), 0, 0, 'C')
+        self.cell(0, 10, f'Tesouraria - Contato: +{self.centro.whatsapp} | Página ' + str(self.page_no()), 0, 0, 'C')
 
-def gerar_recibo_unico_pdf(row):
-    pdf = PDFReport()
-    pdf.add_page()
+# ------------------------------------------------------------------------------
+# Recibos: a parte fixa de cada modelo (cabeçalho, moldura, rótulos, assinatura)
+# é desenhada uma única vez e guardada como trecho de conteúdo PDF; cada recibo
+# só carimba esse trecho e escreve os campos variáveis por cima.
+# ------------------------------------------------------------------------------
+# Ordem fixa de registro das fontes: o trecho guardado se refere a elas por número.
+FONTES_RECIBO = [('Arial', 'B', 14), ('Arial', 'I', 8), ('Arial', '', 12)]
+CAMPOS_RECIBO = ["ID", "Data", "Valor", "Socio", "Categoria", "Descrição", "Conta"]
+
+def _registrar_fontes(pdf):
+    for fonte in FONTES_RECIBO:
+        pdf.set_font(*fonte)
+    pdf.font_family = ''
+
+def _quebrar_linhas(pdf, texto, largura):
+    """Quebra o texto em linhas de até `largura` mm na fonte atual (palavras maiores que a linha são partidas)."""
+    linhas, atual = [], ""
+    for palavra in texto.split(" "):
+        tentativa = f"{atual} {palavra}" if atual else palavra
+        if pdf.get_string_width(tentativa) <= largura:
+            atual = tentativa
+            continue
+        if atual:
+            linhas.append(atual)
+        while pdf.get_string_width(palavra) > largura and len(palavra) > 1:
+            corte = len(palavra) - 1
+            while corte > 1 and pdf.get_string_width(palavra[:corte]) > largura:
+                corte -= 1
+            linhas.append(palavra[:corte])
+            palavra = palavra[corte:]
+        atual = palavra
+    return linhas + [atual]
+
+def _escrever_campo(pdf, x, y, largura, altura, texto, estilo="", recuo=""):
+    """Escreve o texto inteiro no espaço reservado pelo modelo (largura x altura mm), a partir de (x, y).
+
+    Numa linha sai como a célula de 10 mm de sempre; se quebrar, as linhas
+    dividem a altura reservada e, se ainda assim não couberem, a fonte diminui.
+    """
+    tamanho = 12
+    while True:
+        pdf.set_font("Arial", estilo, tamanho)
+        linhas = _quebrar_linhas(pdf, texto, largura - pdf.get_string_width(recuo) - 2 * pdf.c_margin)
+        altura_linha = min(10, altura / len(linhas))
+        # Altura mínima de linha para a fonte (pt -> mm, com entrelinha).
+        if altura_linha >= tamanho * 0.45 or tamanho <= 1:
+            break
+        tamanho -= 1
+    for i, linha in enumerate(linhas):
+        pdf.set_xy(x, y + i * altura_linha)
+        pdf.cell(largura, altura_linha, recuo + linha)
+    pdf.set_font("Arial", estilo, 12)
+
+def _fixo_recibo_unico(pdf):
     pdf.set_fill_color(240, 240, 240)
     pdf.rect(10, 30, 190, 100, 'F')
+    pdf.set_font("Arial", "", 12)
+    for linha, texto in ((4, "A importância supramencionada referente a:"),
+                         (11, "___________________________________________________"),
+                         (12, "Assinatura do Tesoureiro")):
+        pdf.set_xy(10, 55 + 10 * linha)
+        pdf.cell(0, 10, "    " + texto)
+
+def _variavel_recibo_unico(pdf, row):
+    pdf.set_xy(10, 25)
     pdf.set_font("Arial", "B", 16)
     pdf.cell(0, 20, f"RECIBO Nº {row['ID']}", 0, 1, 'C')
     pdf.set_font("Arial", "", 12)
-    pdf.ln(10)
-    texto = f"""
-    VALOR: R$ {row['Valor']:.2f}
-    
-    Recebemos de: {row['Socio']}
-    A importância supramencionada referente a:
-    Categoria: {row['Categoria']}
-    Descrição: {row['Descrição']}
-    
-    Conta de Entrada: {row['Conta']}
-    Data do Recebimento: {row['Data']}
-    
-    ___________________________________________________
-    Assinatura do Tesoureiro
-    """
-    pdf.multi_cell(0, 10, texto)
-    return pdf.output(dest='S').encode('latin-1')
+    # (linha do modelo, linhas reservadas, texto): Valor, Descrição e Data podem ocupar a linha vazia seguinte.
+    for linha, reservadas, texto in ((1, 2, f"VALOR: R$ {row['Valor']:.2f}"), (3, 1, f"Recebemos de: {row['Socio']}"),
+                                     (5, 1, f"Categoria: {row['Categoria']}"), (6, 2, f"Descrição: {row['Descrição']}"),
+                                     (8, 1, f"Conta de Entrada: {row['Conta']}"), (9, 2, f"Data do Recebimento: {row['Data']}")):
+        _escrever_campo(pdf, 10, 55 + 10 * linha, 190, 10 * reservadas, texto, recuo="    ")
+
+def _fixo_recibo_controle(pdf):
+    pdf.line(10, 35, 200, 35)
+    pdf.set_font("Arial", "", 12)
+    # "Referente a" vem por último para poder descer até a linha de assinatura.
+    for i, rotulo in enumerate(["Data:", "Sócio/Pagador:", "Valor:", "Conta:", "Referente a:"]):
+        pdf.set_xy(10, 50 + 10 * i)
+        pdf.cell(50, 10, rotulo, 0, 0)
+    pdf.set_xy(10, 120)
+    pdf.cell(0, 10, "___________________________________", 0, 1, 'C')
+    pdf.cell(0, 10, "Visto da Tesouraria", 0, 1, 'C')
+
+def _variavel_recibo_controle(pdf, row):
+    pdf.set_xy(10, 25)
+    pdf.set_font("Arial", "B", 14)
+    pdf.cell(0, 10, f"RECIBO DE CONTROLE Nº {row['ID']}", 0, 1, 'C')
+    pdf.set_font("Arial", "", 12)
+    valores = [str(row['Data']), str(row['Socio']), f"R$ {row['Valor']:.2f}", str(row['Conta']), f"{row['Categoria']} - {row['Descrição']}"]
+    for i, texto in enumerate(valores):
+        _escrever_campo(pdf, 60, 50 + 10 * i, 140, 30 if i == 4 else 10, texto, estilo="B" if i == 2 else "")
+    pdf.set_font("Arial", "", 12)
+
+MODELOS_RECIBO = {
+    'unico': (_fixo_recibo_unico, _variavel_recibo_unico),
+    'controle': (_fixo_recibo_controle, _variavel_recibo_controle),
+}
 
-def gerar_recibos_unificados_pdf(df_selecionado):
-    pdf = PDFReport()
-    for index, row in df_selecionado.iterrows():
+def _modelo_recibo(modelo, centro):
+    """Trecho de conteúdo PDF com a parte fixa do modelo (inclui o cabeçalho do PDFReport do centro)."""
+    pdf = FPDF()
+    pdf.centro = centro
+    _registrar_fontes(pdf)
+    pdf.add_page()
+    inicio = len(pdf.pages[1])
+    PDFReport.header(pdf)
+    MODELOS_RECIBO[modelo][0](pdf)
+    return pdf.pages[1][inicio:]
+
+class PDFRecibos(PDFReport):
+    """PDFReport cujo cabeçalho carimba o trecho fixo de um modelo de recibo."""
+    def __init__(self, fixo, centro=None):
+        super().__init__(centro)
+        _registrar_fontes(self)
+        self._fixo = fixo
+
+    def header(self):
+        self._out("q\n" + self._fixo + "\nQ")
+        self.font_family = ''
+
+def _hash_recibo(row):
+    return hashlib.sha1("\x1f".join(str(row[c]) for c in CAMPOS_RECIBO).encode('utf-8')).hexdigest()
+
+def _renderizar_recibos(fixo, modelo, linhas, centro=None):
+    """Um PDF por linha; roda também dentro dos processos do pool do lote ZIP."""
+    variavel = MODELOS_RECIBO[modelo][1]
+    saida = []
+    for row in linhas:
+        pdf = PDFRecibos(fixo, centro)
         pdf.add_page()
-        pdf.set_font("Arial", "B", 14)
-        pdf.cell(0, 10, f"RECIBO DE CONTROLE Nº {row['ID']}", 0, 1, 'C')
-        pdf.line(10, 35, 200, 35)
-        pdf.set_font("Arial", "", 12)
-        pdf.ln(15)
-        pdf.cell(50, 10, "Data:", 0, 0); pdf.cell(0, 10, str(row['Data']), 0, 1)
-        pdf.cell(50, 10, "Sócio/Pagador:", 0, 0); pdf.cell(0, 10, str(row['Socio']), 0, 1)
-        pdf.cell(50, 10, "Valor:", 0, 0); pdf.set_font("Arial", "B", 12); pdf.cell(0, 10, f"R$ {row['Valor']:.2f}", 0, 1); pdf.set_font("Arial", "", 12)
-        pdf.cell(50, 10, "Referente a:", 0, 0); pdf.cell(0, 10, f"{row['Categoria']} - {row['Descrição']}", 0, 1)
-        pdf.cell(50, 10, "Conta:", 0, 0); pdf.cell(0, 10, str(row['Conta']), 0, 1)
-        pdf.ln(20)
-        pdf.cell(0, 10, "___________________________________", 0, 1, 'C')
-        pdf.cell(0, 10, "Visto da Tesouraria", 0, 1, 'C')
-    return pdf.output(dest='S').encode('latin-1')
-
-def gerar_relatorio_pdf(df, titulo):
-    pdf = PDFReport()
+        variavel(pdf, row)
+        saida.append(pdf.output(dest='S').encode('latin-1'))
+    return saida
+
+@rastreado("pdf_recibo_unico")
+def gerar_recibo_unico_pdf(row, centro=None):
+    recursos = recursos_centro(centro)
+    fixo = recursos.modelo_recibo('unico')
+    chave = ('unico', row['ID'], _hash_recibo(row))
+    return recursos.recibos.obter(chave, lambda: _renderizar_recibos(fixo, 'unico', [row], recursos.centro)[0])
+
+@rastreado("pdf_recibos_unificados")
+def gerar_recibos_unificados_pdf(df_selecionado, centro=None):
+    recursos = recursos_centro(centro)
+    linhas = df_selecionado.to_dict('records')
+    chave = ('unificado',) + tuple((row['ID'], _hash_recibo(row)) for row in linhas)
+    def gerar():
+        pdf = PDFRecibos(recursos.modelo_recibo('controle'), recursos.centro)
+        for row in linhas:
+            pdf.add_page()
+            _variavel_recibo_controle(pdf, row)
+        return pdf.output(dest='S').encode('latin-1')
+    return recursos.recibos.obter(chave, gerar)
+
+RECIBOS_POR_LOTE = 25
+
+@rastreado("zip_recibos")
+def gerar_zip_recibos(df_selecionado, centro=None):
+    """ZIP com um PDF (modelo único) por recibo; os que faltam no cache são gerados em lotes num pool de processos."""
+    recursos = recursos_centro(centro)
+    centro = recursos.centro
+    fixo = recursos.modelo_recibo('unico')
+    cache = recursos.recibos
+    linhas = df_selecionado.to_dict('records')
+    chaves = [('unico', row['ID'], _hash_recibo(row)) for row in linhas]
+    pdfs = [cache.get(chave) for chave in chaves]
+    faltando = [i for i, pdf in enumerate(pdfs) if pdf is None]
+    lotes = [faltando[i:i + RECIBOS_POR_LOTE] for i in range(0, len(faltando), RECIBOS_POR_LOTE)]
+    feitos = 0
+    try:
+        if len(lotes) < 2 or (os.cpu_count() or 1) < 2:
+            raise OSError("lote pequeno")
+        with ProcessPoolExecutor(max_workers=min(len(lotes), os.cpu_count() or 1)) as pool:
+            futuros = [pool.submit(_renderizar_recibos, fixo, 'unico', [linhas[i] for i in lote], centro) for lote in lotes]
+            for lote, futuro in zip(lotes, futuros):
+                for i, pdf in zip(lote, futuro.result()):
+                    pdfs[i] = pdf
+                feitos += 1
+    except (OSError, BrokenProcessPool, pickle.PicklingError, AttributeError):
+        for lote in lotes[feitos:]:
+            for i, pdf in zip(lote, _renderizar_recibos(fixo, 'unico', [linhas[i] for i in lote], centro)):
+                pdfs[i] = pdf
+    for i in faltando:
+        cache.put(chaves[i], pdfs[i])
+    buffer = BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as zf:
+        for row, pdf in zip(linhas, pdfs):
+            zf.writestr(f"rec_{row['ID']}.pdf", pdf)
+    return buffer.getvalue()
+
+class PDFFluxo(PDFReport):
+    """PDFReport que grava cada página no destino assim que ela é fechada.
+
+    O FPDF guarda todas as páginas até o output(); aqui a página e seu
+    conteúdo viram objetos PDF escritos no arquivo/stream destino no fim de
+    cada página, e só a parte final (fontes, catálogo, xref) fica para o
+    close(). Não suporta links, troca de orientação nem o alias {nb}.
+    """
+    def __init__(self, destino, centro=None):
+        super().__init__(centro)
+        self._destino = destino
+        self._gravado = 0
+
+    def _descarregar(self):
+        dados = self.buffer.encode('latin-1')
+        self._destino.write(dados)
+        self._gravado += len(dados)
+        self.buffer = ''
+
+    def _newobj(self):
+        self.n += 1
+        self.offsets[self.n] = self._gravado + len(self.buffer)
+        self._out(str(self.n) + ' 0 obj')
+
+    def _endpage(self):
+        super()._endpage()
+        n = self.page
+        if n == 1:
+            self._putheader()
+        # Objetos 3+2(n-1) e 4+2(n-1): a mesma numeração que o _putpages do FPDF usaria.
+        self._newobj()
+        self._out('<</Type /Page')
+        self._out('/Parent 1 0 R')
+        self._out('/Resources 2 0 R')
+        self._out('/Contents ' + str(self.n + 1) + ' 0 R>>')
+        self._out('endobj')
+        conteudo = self.pages[n].encode('latin-1')
+        if self.compress:
+            conteudo = zlib.compress(conteudo)
+        self._newobj()
+        self._out('<<' + ('/Filter /FlateDecode ' if self.compress else '') + '/Length ' + str(len(conteudo)) + '>>')
+        self._putstream(conteudo)
+        self._out('endobj')
+        self.pages[n] = ''
+        self._descarregar()
+
+    def _enddoc(self):
+        nb = self.page
+        self.offsets[1] = self._gravado + len(self.buffer)
+        self._out('1 0 obj')
+        self._out('<</Type /Pages')
+        self._out('/Kids [' + ''.join(str(3 + 2 * i) + ' 0 R ' for i in range(nb)) + ']')
+        self._out('/Count ' + str(nb))
+        self._out('/MediaBox [0 0 %.2f %.2f]' % (self.fw_pt, self.fh_pt))
+        self._out('>>')
+        self._out('endobj')
+        self._putfonts()
+        self._putimages()
+        self.offsets[2] = self._gravado + len(self.buffer)
+        self._out('2 0 obj')
+        self._out('<<')
+        self._putresourcedict()
+        self._out('>>')
+        self._out('endobj')
+        self._newobj()
+        self._out('<<')
+        self._putinfo()
+        self._out('>>')
+        self._out('endobj')
+        self._newobj()
+        self._out('<<')
+        self._putcatalog()
+        self._out('>>')
+        self._out('endobj')
+        inicio_xref = self._gravado + len(self.buffer)
+        self._out('xref')
+        self._out('0 ' + str(self.n + 1))
+        self._out('0000000000 65535 f ')
+        for i in range(1, self.n + 1):
+            self._out('%010d 00000 n ' % self.offsets[i])
+        self._out('trailer')
+        self._out('<<')
+        self._puttrailer()
+        self._out('>>')
+        self._out('startxref')
+        self._out(inicio_xref)
+        self._out('%%EOF')
+        self.state = 3
+        self._descarregar()
+
+@rastreado("pdf_relatorio")
+def escrever_relatorio_pdf(df, titulo, destino, centro=None):
+    """Escreve o relatório detalhado em destino (arquivo ou stream binário), página a página."""
+    pdf = PDFFluxo(destino, centro)
     pdf.add_page()
     pdf.set_font("Arial", "B", 12)
     pdf.cell(0, 10, titulo, 0, 1, 'L')
@@ -126,304 +1674,1258 @@ def gerar_relatorio_pdf(df, titulo):
     pdf.cell(30, 8, "Valor", 1)
     pdf.ln()
     pdf.set_font("Arial", "", 8)
-    total = 0
-    for index, row in df.iterrows():
-        pdf.cell(20, 8, str(row['Data']), 1)
-        pdf.cell(30, 8, str(row['Conta'])[:15], 1)
-        pdf.cell(40, 8, str(row['Categoria'])[:20], 1)
-        pdf.cell(70, 8, str(row['Descrição'])[:35], 1)
-        pdf.cell(30, 8, f"{row['Valor']:.2f}", 1)
+    datas = df['Data'].dt.strftime('%Y-%m-%d') if pd.api.types.is_datetime64_any_dtype(df['Data']) else df['Data'].astype(str)
+    colunas = zip(datas, df['Conta'].astype(str).str[:15], df['Categoria'].astype(str).str[:20],
+                  df['Descrição'].astype(str).str[:35], df['Valor'].map('{:.2f}'.format))
+    for data, conta, categoria, descricao, valor in colunas:
+        pdf.cell(20, 8, data, 1)
+        pdf.cell(30, 8, conta, 1)
+        pdf.cell(40, 8, categoria, 1)
+        pdf.cell(70, 8, descricao, 1)
+        pdf.cell(30, 8, valor, 1)
         pdf.ln()
-        total += row['Valor']
+    total = df['Valor'].sum()
     pdf.set_font("Arial", "B", 10)
     pdf.cell(160, 10, "TOTAL DO PERÍODO:", 1, 0, 'R')
     pdf.cell(30, 10, f"R$ {total:.2f}", 1, 1, 'C')
-    return pdf.output(dest='S').encode('latin-1')
+    pdf.close()
+
+def gerar_relatorio_pdf(df, titulo, centro=None):
+    destino = BytesIO()
+    escrever_relatorio_pdf(df, titulo, destino, centro)
+    return destino.getvalue()
+
+# ==============================================================================
+# RELATÓRIOS (LIVRO TIPADO)
+# ==============================================================================
+def _apagar_arquivo(caminho):
+    try:
+        os.remove(caminho)
+    except OSError:
+        pass
+
+class MotorRelatorios:
+    """Consultas de relatório sobre uma cópia tipada do livro (Data em datetime64, ordenada).
+
+    A cópia só é refeita quando a versão do livro muda; o recorte por período
+    é uma busca binária nas datas, e os resumos e PDFs ficam memorizados por
+    (período, versão do livro).
+    """
+    def __init__(self, livro):
+        self.livro = livro
+        self.versao = None
+        self._df = None
+        self._datas = None
+        self._trava = threading.Lock()
+        self._resumos = CacheLRU(64)
+        self._pdfs = CacheLRU(8, ao_descartar=_apagar_arquivo)
+        # Os PDFs em disco vão embora com o motor (sessão encerrada, centro descartado) ou no fim do processo.
+        weakref.finalize(self, self._pdfs.limpar)
+
+    def tabela(self):
+        with self._trava:
+            if self.versao != self.livro.versao:
+                versao = self.livro.versao
+                df = self.livro.df
+                df = df.assign(Data=_converter_datas(df['Data']), Valor=pd.to_numeric(df['Valor'], errors='coerce').fillna(0.0))
+                df = df[df['Data'].notna()].sort_values('Data', kind='stable').reset_index(drop=True)
+                self._df, self._datas, self.versao = df, df['Data'].to_numpy(), versao
+            return self._df
+
+    def periodo(self, inicio, fim):
+        """Lançamentos com inicio <= Data <= fim (datas inclusivas)."""
+        df = self.tabela()
+        i = np.searchsorted(self._datas, pd.Timestamp(inicio).to_datetime64(), 'left')
+        j = np.searchsorted(self._datas, (pd.Timestamp(fim) + pd.Timedelta(days=1)).to_datetime64(), 'left')
+        return df.iloc[i:j]
+
+    def resumo(self, inicio, fim, colunas):
+        self.tabela()
+        chave = (self.versao, inicio, fim, tuple(colunas))
+        return self._resumos.obter(chave, lambda: self.periodo(inicio, fim).groupby(list(colunas))['Valor'].sum().reset_index())
+
+    def pdf_periodo(self, inicio, fim, titulo, centro=None):
+        """PDF do relatório detalhado; é gravado num arquivo temporário e reaproveitado enquanto o livro não mudar."""
+        self.tabela()
+        def gravar():
+            with tempfile.NamedTemporaryFile(prefix="tesouraria_rel_", suffix=".pdf", delete=False) as arquivo:
+                escrever_relatorio_pdf(self.periodo(inicio, fim), titulo, arquivo, centro)
+            return arquivo.name
+        caminho = self._pdfs.obter((self.versao, inicio, fim, titulo, centro), gravar)
+        with open(caminho, 'rb') as arquivo:
+            return arquivo.read()
 
 # ==============================================================================
 # FUNÇÕES DE PARSE (EXTRATO)
 # ==============================================================================
+def _hash_conteudo(conteudo):
+    return hashlib.sha256(conteudo).hexdigest()
+
+def _ler_conteudo(file):
+    file.seek(0)
+    return file.getvalue() if hasattr(file, 'getvalue') else file.read()
+
+# Tokens do OFX (SGML 1.x ou XML 2.x), aplicados direto sobre os bytes do arquivo.
+RE_OFX_CONTA = re.compile(rb'<(?:BANK|CC)ACCTFROM>.*?<ACCTID>\s*([^<\r\n]+)', re.I | re.S)
+RE_OFX_TRANSACAO = re.compile(rb'<STMTTRN>(.*?)</STMTTRN>', re.I | re.S)
+RE_OFX_CAMPO = re.compile(rb'<(DTPOSTED|TRNAMT|FITID|MEMO|NAME)>\s*([^<\r\n]*)', re.I)
+
+def _texto_ofx(valor):
+    valor = valor.strip()
+    try:
+        texto = valor.decode('utf-8')
+    except UnicodeDecodeError:
+        texto = valor.decode('latin-1')
+    return html.unescape(texto) if '&' in texto else texto
+
+def ler_ofx_colunar(conteudo):
+    """Lê os blocos <STMTTRN> direto dos bytes, sem decodificar o arquivo inteiro.
+
+    Devolve um DataFrame com as colunas Data, Valor, Descrição, FITID e
+    Conta_Extrato (ACCTID da conta de origem, para arquivos com várias contas).
+    """
+    contas = [(m.start(), _texto_ofx(m.group(1))) for m in RE_OFX_CONTA.finditer(conteudo)]
+    inicio_contas = [p for p, _ in contas]
+    datas, valores, memos, fitids, ids_conta = [], [], [], [], []
+    for bloco in RE_OFX_TRANSACAO.finditer(conteudo):
+        campos = {k.upper(): v for k, v in RE_OFX_CAMPO.findall(conteudo, bloco.start(1), bloco.end(1))}
+        datas.append(campos.get(b'DTPOSTED', b'')[:8].decode('ascii', 'ignore'))
+        valores.append(campos.get(b'TRNAMT', b'').strip().decode('ascii', 'ignore'))
+        memos.append(_texto_ofx(campos.get(b'MEMO') or campos.get(b'NAME') or b''))
+        fitids.append(_texto_ofx(campos.get(b'FITID', b'')))
+        i = bisect_right(inicio_contas, bloco.start()) - 1
+        ids_conta.append(contas[i][1] if i >= 0 else "")
+    return pd.DataFrame({
+        "Data": pd.to_datetime(pd.Series(datas, dtype=object), format='%Y%m%d', errors='coerce').dt.date,
+        "Valor": pd.to_numeric(pd.Series(valores, dtype=object).str.replace(',', '.', regex=False), errors='coerce'),
+        "Descrição": memos,
+        "FITID": fitids,
+        "Conta_Extrato": ids_conta,
+    })
+
+def _parse_ofx_ofxparse(content_bytes):
+    """Leitura completa via ofxparse, usada quando o leitor rápido não encontra transações."""
+    try:
+        content_text = content_bytes.decode('utf-8')
+    except UnicodeDecodeError:
+        content_text = content_bytes.decode('latin-1')
+    if "<LEDGERBAL>" not in content_text:
+        dummy = "<LEDGERBAL><BALAMT>0</BALAMT><DTASOF>20240101000000</DTASOF></LEDGERBAL>"
+        if "</STMTRS>" in content_text: content_text = content_text.replace("</STMTRS>", f"{dummy}</STMTRS>")
+        elif "</BANKTRANLIST>" in content_text: content_text = content_text.replace("</BANKTRANLIST>", f"</BANKTRANLIST>{dummy}")
+    file_fixed = BytesIO(content_text.encode('utf-8'))
+    ofx = OfxParser.parse(file_fixed)
+    transactions = []
+    if hasattr(ofx, 'accounts'):
+        for account in ofx.accounts:
+            if hasattr(account, 'statement') and account.statement:
+                for trans in account.statement.transactions:
+                    transactions.append({"Data": trans.date.date(), "Valor": float(trans.amount), "Descrição": trans.memo})
+    return pd.DataFrame(transactions)
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def _parse_ofx_em_cache(chave, _conteudo):
+    obter_contadores_arquivos()["OFX"].falhou()
+    df = ler_ofx_colunar(_conteudo)
+    if df.empty:
+        df = _parse_ofx_ofxparse(_conteudo)
+    return df
+
+@rastreado("parse_ofx")
 def parse_ofx(file):
     try:
-        file.seek(0)
-        content_bytes = file.read()
-        try:
-            content_text = content_bytes.decode('utf-8')
-        except:
-            content_text = content_bytes.decode('latin-1')
-        if "<LEDGERBAL>" not in content_text:
-            dummy = "<LEDGERBAL><BALAMT>0</BALAMT><DTASOF>20240101000000</DTASOF></LEDGERBAL>"
-            if "</STMTRS>" in content_text: content_text = content_text.replace("</STMTRS>", f"{dummy}</STMTRS>")
-            elif "</BANKTRANLIST>" in content_text: content_text = content_text.replace("</BANKTRANLIST>", f"</BANKTRANLIST>{dummy}")
-        file_fixed = BytesIO(content_text.encode('utf-8'))
-        ofx = OfxParser.parse(file_fixed)
-        transactions = []
-        if hasattr(ofx, 'accounts'):
-            for account in ofx.accounts:
-                if hasattr(account, 'statement') and account.statement:
-                    for trans in account.statement.transactions:
-                        transactions.append({"Data": trans.date.date(), "Valor": float(trans.amount), "Descrição": trans.memo})
-        return pd.DataFrame(transactions)
+        conteudo = _ler_conteudo(file)
+        return obter_contadores_arquivos()["OFX"].chamar(_parse_ofx_em_cache, _hash_conteudo(conteudo), conteudo)
     except Exception as e:
         st.error(f"Erro OFX: {e}")
         return pd.DataFrame()
 
-def parse_pdf_extrato(file):
-    transactions = []
+# Padrões de linha de extrato, do mais específico ao mais genérico:
+# "dd/mm/aaaa descrição valor" e "dd/mm descrição valor" (ano corrente).
+PADROES_EXTRATO_PDF = [
+    re.compile(r'(\d{2}/\d{2}/\d{4})\s+(.+?)\s+(-?[\d\.,]+)$'),
+    re.compile(r'(\d{2}/\d{2})\s+(.+?)\s+(-?[\d\.,]+)$'),
+]
+PAGINAS_POR_LOTE_PDF = 4
+MIN_PAGINAS_PARALELO_PDF = 8
+
+def _extrair_paginas(conteudo, inicio, fim):
+    """Texto das páginas [inicio, fim) do PDF; roda dentro dos processos do pool."""
+    with pdfplumber.open(BytesIO(conteudo)) as pdf:
+        return [pdf.pages[i].extract_text() or "" for i in range(inicio, fim)]
+
+# PDF do processo do pool: chega uma vez por processo, pelo initializer, em vez de junto com cada lote.
+_PDF_DO_PROCESSO = None
+
+def _receber_pdf(conteudo):
+    global _PDF_DO_PROCESSO
+    _PDF_DO_PROCESSO = conteudo
+
+def _extrair_paginas_do_processo(inicio, fim):
+    return _extrair_paginas(_PDF_DO_PROCESSO, inicio, fim)
+
+def _transacoes_do_texto(texto, ano):
+    for line in texto.split('\n'):
+        for padrao in PADROES_EXTRATO_PDF:
+            match = padrao.search(line)
+            if match:
+                try:
+                    val_str = match.group(3).replace('.', '').replace(',', '.')
+                    data = match.group(1) if len(match.group(1)) == 10 else match.group(1) + f"/{ano}"
+                    yield {"Data": data, "Descrição": match.group(2), "Valor": float(val_str)}
+                except ValueError: pass
+                break
+
+def _textos_em_paralelo(conteudo, total_paginas):
+    """Extrai lotes de páginas num pool de processos, devolvendo-os em ordem."""
+    lotes = [(i, min(i + PAGINAS_POR_LOTE_PDF, total_paginas)) for i in range(0, total_paginas, PAGINAS_POR_LOTE_PDF)]
+    entregues = 0
     try:
-        with pdfplumber.open(file) as pdf:
+        with ProcessPoolExecutor(max_workers=min(len(lotes), os.cpu_count() or 1),
+                                 initializer=_receber_pdf, initargs=(conteudo,)) as pool:
+            futuros = [pool.submit(_extrair_paginas_do_processo, ini, fim) for ini, fim in lotes]
+            for futuro in futuros:
+                for texto in futuro.result():
+                    yield texto
+                entregues += 1
+    except (OSError, BrokenProcessPool, pickle.PicklingError, AttributeError):
+        # Sem pool disponível (ex.: ambiente que não permite fork): segue no processo atual.
+        for ini, fim in lotes[entregues:]:
+            yield from _extrair_paginas(conteudo, ini, fim)
+
+def iterar_pdf_extrato(conteudo, ano=None):
+    """Gera as transações do extrato em PDF à medida que as páginas são lidas."""
+    ano = ano or date.today().year
+    with pdfplumber.open(BytesIO(conteudo)) as pdf:
+        total_paginas = len(pdf.pages)
+        if total_paginas < MIN_PAGINAS_PARALELO_PDF or (os.cpu_count() or 1) < 2:
             for page in pdf.pages:
-                text = page.extract_text()
-                if text:
-                    for line in text.split('\n'):
-                        match = re.search(r'(\d{2}/\d{2})\s+(.+?)\s+(-?[\d\.,]+)$', line)
-                        if match:
-                            try:
-                                val_str = match.group(3).replace('.', '').replace(',', '.')
-                                transactions.append({"Data": match.group(1) + f"/{date.today().year}", "Descrição": match.group(2), "Valor": float(val_str)})
-                            except: pass
-    except: pass
-    return pd.DataFrame(transactions)
+                yield from _transacoes_do_texto(page.extract_text() or "", ano)
+            return
+    for texto in _textos_em_paralelo(conteudo, total_paginas):
+        yield from _transacoes_do_texto(texto, ano)
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def _parse_pdf_em_cache(chave, ano, _conteudo):
+    obter_contadores_arquivos()["PDF"].falhou()
+    # Um erro no meio da leitura sobe sem ir para o cache: o mesmo arquivo é lido de novo na próxima tentativa.
+    return pd.DataFrame(list(iterar_pdf_extrato(_conteudo, ano)))
+
+@rastreado("parse_pdf_extrato")
+def parse_pdf_extrato(file):
+    """Extrato em PDF como DataFrame; o mesmo arquivo (pelo hash do conteúdo) não é lido duas vezes."""
+    try:
+        conteudo = _ler_conteudo(file)
+        return obter_contadores_arquivos()["PDF"].chamar(_parse_pdf_em_cache, _hash_conteudo(conteudo), date.today().year, conteudo)
+    except Exception as e:
+        st.error(f"Erro PDF: {e}")
+        return pd.DataFrame()
+
+# ------------------------------------------------------------------------------
+# Extratos em planilha (CSV / Excel)
+# ------------------------------------------------------------------------------
+# Nomes de coluna usados pelos bancos, já sem acento e em minúsculas (ver _nome_coluna).
+# Vale primeiro o nome exato; um campo ainda sem coluna aceita nome que comece pelo apelido.
+APELIDOS_COLUNAS_EXTRATO = {
+    'Data': ["data", "data lancamento", "data do lancamento", "data movimento", "data mov", "data da transacao",
+             "data transacao", "data operacao", "dt", "dt lancamento", "date"],
+    'Descrição': ["descricao", "historico", "lancamento", "detalhes", "detalhamento", "memo", "estabelecimento",
+                  "descricao do lancamento", "titulo", "description"],
+    'Valor': ["valor", "valor r", "valor em r", "valor lancamento", "montante", "quantia", "amount"],
+    'Crédito': ["credito", "creditos", "entrada", "entradas", "valor credito"],
+    'Débito': ["debito", "debitos", "saida", "saidas", "valor debito"],
+    'Natureza': ["d c", "c d", "dc", "cd", "natureza", "sinal"],
+    'FITID': ["documento", "n documento", "no documento", "numero documento", "numero do documento", "n doc", "doc",
+              "id", "identificador", "id transacao", "autenticacao"],
+}
+LINHAS_POR_BLOCO_TABELA = 50_000
+LINHAS_BUSCA_CABECALHO = 30
+RE_LINHA_SALDO = re.compile(r'^\s*saldo\b', re.I)
+FORMATOS_DATA_EXTRATO = ['%d/%m/%Y', '%d/%m/%y', '%d-%m-%Y', '%d.%m.%Y', '%Y-%m-%d']
+
+def _nome_coluna(nome):
+    texto = unicodedata.normalize('NFKD', str(nome or "")).encode('ascii', 'ignore').decode().lower()
+    return " ".join(re.sub(r'[^a-z0-9]+', ' ', texto).split())
+
+def _mapear_colunas(cabecalho):
+    """{campo: posição} a partir dos nomes do cabeçalho; None se não houver Data e algum valor."""
+    nomes = [_nome_coluna(c) for c in cabecalho]
+    mapa = {}
+    for campo, apelidos in APELIDOS_COLUNAS_EXTRATO.items():
+        pos = next((i for i, n in enumerate(nomes) if n in apelidos and i not in mapa.values()), None)
+        if pos is not None: mapa[campo] = pos
+    for campo, apelidos in APELIDOS_COLUNAS_EXTRATO.items():
+        if campo in mapa: continue
+        pos = next((i for i, n in enumerate(nomes) if i not in mapa.values()
+                    and any(n.startswith(a + " ") for a in apelidos)), None)
+        if pos is not None: mapa[campo] = pos
+    if 'Data' not in mapa or not ({'Valor', 'Crédito', 'Débito'} & mapa.keys()):
+        return None
+    return mapa
+
+def _achar_cabecalho(linhas):
+    """(índice da linha de cabeçalho, mapa de colunas) entre as primeiras linhas do arquivo."""
+    for i, linha in enumerate(linhas):
+        mapa = _mapear_colunas(linha)
+        if mapa: return i, mapa
+    raise ValueError("Cabeçalho não reconhecido: o arquivo precisa de colunas de data e valor (ou crédito/débito).")
+
+def _valores_extrato(serie):
+    """Valores em texto ('1.234,56', '-1,234.56', 'R$ -10,00', '150,00 D', '(20,00)') ou número -> float.
+
+    A marca decimal é decidida valor a valor: é o último '.' ou ',' seguido de
+    1 ou 2 dígitos no fim; os demais separadores são de milhar.
+    """
+    if pd.api.types.is_numeric_dtype(serie):
+        return serie.astype(float)
+    eh_texto = serie.map(lambda v: isinstance(v, str)) if serie.dtype == object else pd.Series(True, index=serie.index)
+    texto = serie.where(eh_texto).fillna("").astype(str).str.strip().str.upper()
+    negativo = texto.str.contains(r'^[^\d]*[-(]|[-D]$', regex=True)
+    texto = texto.str.replace(r'[^\d.,]', '', regex=True)
+    decimais = texto.str.extract(r'[.,](\d{1,2})$')[0]
+    inteiros = texto.str.replace(r'[.,]\d{1,2}$', '', regex=True).str.replace(r'[.,]', '', regex=True)
+    valores = pd.to_numeric(inteiros + ("." + decimais).fillna(""), errors='coerce')
+    valores = valores.where(~negativo, -valores)
+    if not eh_texto.all():
+        valores = valores.where(eh_texto, pd.to_numeric(serie.where(~eh_texto), errors='coerce'))
+    return valores
+
+def _datas_extrato(serie):
+    """Datas em dd/mm/aaaa (e variações) ou já como data -> datetime64, um formato fixo por vez."""
+    if pd.api.types.is_datetime64_any_dtype(serie):
+        return serie
+    eh_texto = serie.map(lambda v: isinstance(v, str)) if serie.dtype == object else pd.Series(True, index=serie.index)
+    datas = pd.to_datetime(serie.where(~eh_texto), errors='coerce')
+    texto = serie.where(eh_texto).astype(str).str.strip().str[:10]
+    for formato in FORMATOS_DATA_EXTRATO:
+        faltando = datas.isna() & eh_texto
+        if not faltando.any(): break
+        datas = datas.fillna(pd.to_datetime(texto.where(faltando), format=formato, errors='coerce'))
+    return datas
+
+def _normalizar_bloco(bloco, mapa):
+    """Bloco cru (colunas pelas posições do mapa) -> Data, Descrição, Valor e FITID, sem linhas de saldo."""
+    coluna = lambda campo: bloco[mapa[campo]] if campo in mapa else None
+    if 'Valor' in mapa:
+        valores = _valores_extrato(coluna('Valor'))
+        if 'Natureza' in mapa:
+            debito = coluna('Natureza').fillna("").astype(str).str.strip().str.upper().str.startswith('D')
+            valores = valores.abs().where(~debito, -valores.abs())
+    else:
+        credito = _valores_extrato(coluna('Crédito')) if 'Crédito' in mapa else pd.Series(np.nan, index=bloco.index)
+        debito = _valores_extrato(coluna('Débito')) if 'Débito' in mapa else pd.Series(np.nan, index=bloco.index)
+        valores = credito.fillna(0.0) - debito.abs().fillna(0.0)
+        valores = valores.where(credito.notna() | debito.notna())
+    descricoes = coluna('Descrição').fillna("").astype(str).str.strip() if 'Descrição' in mapa else pd.Series("", index=bloco.index)
+    datas = _datas_extrato(coluna('Data'))
+    manter = datas.notna() & valores.notna() & ~descricoes.str.match(RE_LINHA_SALDO)
+    saida = pd.DataFrame({"Data": datas[manter].dt.date, "Descrição": descricoes[manter], "Valor": valores[manter].astype(float)})
+    if 'FITID' in mapa:
+        saida['FITID'] = coluna('FITID')[manter].fillna("").astype(str).str.strip()
+    return saida.reset_index(drop=True)
+
+def _decodificar_csv(conteudo):
+    """(codificação, separador, primeiras linhas já divididas em campos) de um CSV."""
+    amostra = conteudo[:65536]
+    if len(conteudo) > len(amostra) and b'\n' in amostra:
+        amostra = amostra[:amostra.rindex(b'\n')]
+    for codificacao in ('utf-8-sig', 'cp1252'):
+        try:
+            texto = amostra.decode(codificacao)
+            break
+        except UnicodeDecodeError:
+            continue
+    try:
+        separador = csv.Sniffer().sniff(texto, delimiters=';,\t|').delimiter
+    except csv.Error:
+        separador = ';' if texto.count(';') >= texto.count(',') else ','
+    linhas = list(csv.reader(texto.splitlines()[:LINHAS_BUSCA_CABECALHO], delimiter=separador))
+    return codificacao, separador, linhas
+
+def _blocos_csv(conteudo):
+    codificacao, separador, linhas = _decodificar_csv(conteudo)
+    inicio, mapa = _achar_cabecalho(linhas)
+    posicoes = sorted(set(mapa.values()))
+    leitor = pd.read_csv(BytesIO(conteudo), sep=separador, encoding=codificacao, skiprows=inicio, header=None, skip_blank_lines=True,
+                         usecols=posicoes, dtype=str, chunksize=LINHAS_POR_BLOCO_TABELA, on_bad_lines='skip', engine='c')
+    primeiro = True
+    for bloco in leitor:
+        if primeiro:
+            bloco = bloco.iloc[1:]  # a própria linha de cabeçalho
+            primeiro = False
+        yield bloco, mapa
+
+def _blocos_excel(conteudo):
+    livro = openpyxl.load_workbook(BytesIO(conteudo), read_only=True, data_only=True)
+    try:
+        for planilha in livro.worksheets:
+            linhas = planilha.iter_rows(values_only=True)
+            inicio = [tuple(l) for _, l in zip(range(LINHAS_BUSCA_CABECALHO), linhas)]
+            try:
+                indice, mapa = _achar_cabecalho(inicio)
+            except ValueError:
+                continue
+            posicoes = sorted(set(mapa.values()))
+            pegar = lambda linha: [linha[p] if p < len(linha) else None for p in posicoes]
+            bloco = [pegar(l) for l in inicio[indice + 1:]]
+            for linha in linhas:
+                bloco.append(pegar(linha))
+                if len(bloco) >= LINHAS_POR_BLOCO_TABELA:
+                    yield pd.DataFrame(bloco, columns=posicoes, dtype=object), mapa
+                    bloco = []
+            if bloco:
+                yield pd.DataFrame(bloco, columns=posicoes, dtype=object), mapa
+            return
+        raise ValueError("Nenhuma aba com cabeçalho reconhecido (colunas de data e valor).")
+    finally:
+        livro.close()
+
+def iterar_tabela_extrato(conteudo, formato):
+    """Gera o extrato de um CSV ou .xlsx em blocos já normalizados (Data, Descrição, Valor[, FITID]).
+
+    O CSV é lido em pedaços de LINHAS_POR_BLOCO_TABELA linhas, todas as colunas
+    como texto; o Excel, linha a linha pelo openpyxl em modo somente leitura.
+    """
+    blocos = _blocos_csv(conteudo) if formato == 'csv' else _blocos_excel(conteudo)
+    for bloco, mapa in blocos:
+        yield _normalizar_bloco(bloco, mapa)
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def _parse_tabela_em_cache(chave, formato, _conteudo):
+    obter_contadores_arquivos()["planilhas"].falhou()
+    blocos = list(iterar_tabela_extrato(_conteudo, formato))
+    return pd.concat(blocos, ignore_index=True) if blocos else pd.DataFrame()
+
+@rastreado("parse_tabela_extrato")
+def parse_tabela_extrato(file):
+    """Extrato em CSV ou Excel (.xlsx) como DataFrame, com as colunas reconhecidas pelo cabeçalho."""
+    formato = 'csv' if file.name.lower().endswith('.csv') else 'xlsx'
+    try:
+        conteudo = _ler_conteudo(file)
+        return obter_contadores_arquivos()["planilhas"].chamar(_parse_tabela_em_cache, _hash_conteudo(conteudo), formato, conteudo)
+    except Exception as e:
+        st.error(f"Erro na planilha: {e}")
+        return pd.DataFrame()
+
+# ==============================================================================
+# CONCILIAÇÃO (DUPLICIDADES E PAREAMENTO)
+# ==============================================================================
+def _impressao_descricao(serie):
+    """Descrição normalizada (sem acento, minúscula, só letras e números) para comparar textos de extrato."""
+    return (serie.fillna("").astype(str).str.normalize('NFKD').str.encode('ascii', 'ignore').str.decode('ascii')
+            .str.lower().str.replace(r'[^a-z0-9]+', ' ', regex=True).str.strip())
+
+def _chaves_lancamento(datas, tipos, centavos, impressoes):
+    """Chave exata (data, tipo, valor em centavos, descrição normalizada) usada no índice de duplicidades."""
+    return (datas.dt.strftime('%Y-%m-%d').fillna("") + "|" + tipos.astype(str) + "|"
+            + centavos.astype(str) + "|" + impressoes)
+
+def preparar_extrato(df_imp):
+    """Normaliza as linhas importadas e calcula Tipo e Ref_Extrato (FITID ou impressão digital)."""
+    extrato = df_imp.reset_index(drop=True).copy()
+    if 'Descrição' not in extrato: extrato['Descrição'] = ""
+    valores = pd.to_numeric(extrato['Valor'], errors='coerce') if 'Valor' in extrato else pd.Series(0.0, index=extrato.index)
+    extrato['Valor'] = valores.fillna(0.0).astype(float)
+    datas = _converter_datas(extrato['Data']) if 'Data' in extrato else pd.Series(pd.NaT, index=extrato.index)
+    extrato['Data'] = datas.dt.date.where(datas.notna(), extrato.get('Data'))
+    extrato['Tipo'] = extrato['Valor'].gt(0).map({True: "Entrada", False: "Saída"})
+    centavos = (extrato['Valor'].abs() * 100).round().astype('int64')
+    chaves = _chaves_lancamento(datas, extrato['Tipo'], centavos, _impressao_descricao(extrato['Descrição']))
+    impressoes = chaves.map(lambda c: "fp:" + hashlib.sha1(c.encode('utf-8')).hexdigest()[:16])
+    fitid = extrato['FITID'].fillna("").astype(str).str.strip() if 'FITID' in extrato else pd.Series("", index=extrato.index)
+    extrato['Ref_Extrato'] = fitid.where(fitid != "", impressoes)
+    extrato['_data'] = datas
+    extrato['_centavos'] = centavos
+    extrato['_chave'] = chaves
+    return extrato
+
+@rastreado("conciliar_extrato")
+def conciliar_extrato(livro, df_imp, conta, janela_dias=3, tolerancia=0.01):
+    """Classifica cada linha do extrato como Novo, Duplicado ou Conciliado.
+
+    Primeiro procura a linha nos índices exatos (Ref_Extrato e data/valor/descrição)
+    dos lançamentos da conta; o que sobra é pareado com lançamentos manuais ainda
+    não conciliados do mesmo tipo, valor dentro da tolerância e data dentro da
+    janela, via busca binária sobre os valores ordenados.
+
+    Devolve (extrato, pendentes): o extrato com as colunas Situação e ID_Livro, e
+    os lançamentos manuais do período que ficaram sem par no extrato.
+    """
+    extrato = preparar_extrato(df_imp)
+    extrato['Situação'] = "Novo"
+    extrato['ID_Livro'] = pd.Series(pd.NA, index=extrato.index, dtype='Int64')
+    datas_validas = extrato['_data'].dropna()
+    if datas_validas.empty:
+        return extrato, pd.DataFrame(columns=COLUNAS_FINANCEIRO)
+    inicio = (datas_validas.min() - pd.Timedelta(days=janela_dias)).date()
+    fim = (datas_validas.max() + pd.Timedelta(days=janela_dias)).date()
+    livro_df = livro.consultar(inicio=inicio, fim=fim, conta=conta).reset_index(drop=True)
+    if livro_df.empty:
+        return extrato, livro_df
+
+    datas_livro = _converter_datas(livro_df['Data'])
+    centavos_livro = (pd.to_numeric(livro_df['Valor'], errors='coerce').fillna(0.0).abs() * 100).round().astype('int64')
+    chaves_livro = _chaves_lancamento(datas_livro, livro_df['Tipo'].fillna(""), centavos_livro,
+                                      _impressao_descricao(livro_df['Descrição']))
+    ids_livro = livro_df['ID'].astype(int).tolist()
+    manuais = (livro_df['Conciliado'] == "Manual").tolist()
+
+    por_ref = {ref: i for i, ref in enumerate(livro_df['Ref_Extrato'].tolist()) if isinstance(ref, str) and ref}
+    por_chave = {}
+    for i, chave in enumerate(chaves_livro.tolist()):
+        por_chave.setdefault(chave, []).append(i)
+    usados = set()
+
+    situacao, id_livro = extrato['Situação'].tolist(), [None] * len(extrato)
+    def _marcar(j, i):
+        usados.add(i)
+        situacao[j] = "Conciliado" if manuais[i] else "Duplicado"
+        id_livro[j] = ids_livro[i]
+
+    # 1) Índices exatos: a mesma linha de extrato já lançada (ou já conciliada).
+    for j, (ref, chave) in enumerate(zip(extrato['Ref_Extrato'].tolist(), extrato['_chave'].tolist())):
+        i = por_ref.get(ref)
+        if i is not None and i not in usados:
+            situacao[j] = "Duplicado"; id_livro[j] = ids_livro[i]; usados.add(i)
+            continue
+        candidatos = por_chave.get(chave)
+        while candidatos:
+            i = candidatos.pop()
+            if i not in usados:
+                _marcar(j, i)
+                break
+
+    # 2) Pareamento aproximado com lançamentos manuais: valor ± tolerância, data ± janela.
+    tol = int(round(tolerancia * 100))
+    janela = pd.Timedelta(days=janela_dias)
+    datas_l = datas_livro.tolist()
+    por_tipo = {}
+    for i, (tipo, centavos) in enumerate(zip(livro_df['Tipo'].tolist(), centavos_livro.tolist())):
+        if manuais[i] and i not in usados and pd.notna(datas_l[i]):
+            por_tipo.setdefault(tipo, []).append((centavos, i))
+    for lista in por_tipo.values():
+        lista.sort()
+    valores_por_tipo = {t: [v for v, _ in lista] for t, lista in por_tipo.items()}
+    linhas = zip(extrato['Tipo'].tolist(), extrato['_centavos'].tolist(), extrato['_data'].tolist())
+    for j, (tipo, alvo, data_alvo) in enumerate(linhas):
+        if situacao[j] != "Novo" or pd.isna(data_alvo) or tipo not in por_tipo:
+            continue
+        lista, valores = por_tipo[tipo], valores_por_tipo[tipo]
+        melhor, menor_dif = None, None
+        for k in range(bisect_left(valores, alvo - tol), bisect_right(valores, alvo + tol)):
+            i = lista[k][1]
+            if i in usados:
+                continue
+            dif = abs(datas_l[i] - data_alvo)
+            if dif <= janela and (menor_dif is None or dif < menor_dif):
+                melhor, menor_dif = i, dif
+        if melhor is not None:
+            _marcar(j, melhor)
+
+    extrato['Situação'] = situacao
+    extrato['ID_Livro'] = pd.array(id_livro, dtype='Int64')
+    # Lançamentos manuais no intervalo do próprio extrato que nenhuma linha confirmou.
+    no_periodo = (datas_livro >= datas_validas.min()) & (datas_livro <= datas_validas.max())
+    sem_par = pd.Series([m and i not in usados for i, m in enumerate(manuais)], index=livro_df.index)
+    pendentes = livro_df[no_periodo & sem_par]
+    return extrato, pendentes
+
+COLUNAS_GRADE_EDITAVEIS = ["Categoria", "Centro_Custo", "Socio"]
+
+def montar_grade_importacao(extrato):
+    """Grade de categorização com as linhas novas do extrato (Categoria começa em 'Ignorar')."""
+    novas = extrato[extrato['Situação'] == "Novo"]
+    grade = pd.DataFrame({
+        "Data": novas['Data'].values,
+        "Descrição": novas['Descrição'].fillna("").astype(str).values,
+        "Valor": novas['Valor'].abs().values,
+        "Tipo": novas['Tipo'].values,
+        "Categoria": "Ignorar",
+        "Centro_Custo": "Geral",
+        "Socio": "N/A",
+        "Ref_Extrato": novas['Ref_Extrato'].values,
+    })
+    return grade
+
+def aplicar_em_massa(grade, trecho, categoria=None, socio=None, centro_custo=None, tipos=None):
+    """Preenche as colunas informadas em todas as linhas cuja descrição contém o trecho.
+
+    Devolve quantas linhas foram alteradas; tipos restringe a Entrada/Saída.
+    """
+    mask = grade['Descrição'].str.contains(trecho, case=False, regex=False) if trecho else pd.Series(True, index=grade.index)
+    if tipos is not None:
+        mask &= grade['Tipo'].isin(tipos)
+    for coluna, valor in (("Categoria", categoria), ("Socio", socio), ("Centro_Custo", centro_custo)):
+        if valor is not None:
+            grade.loc[mask, coluna] = valor
+    return int(mask.sum())
+
+def lancamentos_da_grade(grade, conta):
+    """Lançamentos prontos para append_many a partir das linhas categorizadas da grade."""
+    escolhidas = grade[grade['Categoria'] != "Ignorar"]
+    return [{
+        "Data": r.Data, "Tipo": r.Tipo, "Conta": conta, "Categoria": r.Categoria, "Centro_Custo": r.Centro_Custo,
+        "Descrição": r.Descrição, "Valor": r.Valor, "Socio": r.Socio, "Conciliado": "Auto", "Ref_Extrato": r.Ref_Extrato
+    } for r in escolhidas.itertuples()]
+
+# ==============================================================================
+# REGRAS DE CATEGORIZAÇÃO
+# ==============================================================================
+# Padrão: palavra/trecho da descrição (sem diferenciar maiúsculas) ou /regex/.
+# Campos vazios não restringem (Tipo, Conta, Valor_Min, Valor_Max) nem preenchem (Categoria, Centro_Custo, Socio).
+COLUNAS_REGRAS = ["Padrão", "Tipo", "Conta", "Valor_Min", "Valor_Max", "Categoria", "Centro_Custo", "Socio"]
+
+RE_REGRA_GRUPOS = re.compile(r'\\[1-9]|\(\?P[<=]')
+RE_REGRA_FLAGS = re.compile(r'^((?:\(\?[aiLmsux]+\))+)')
+
+def _corpo_regex(padrao):
+    """Corpo de uma regra /regex/ pronto para o regex combinado, ou None se não servir.
+
+    Flags globais no início, como (?i), só valem no começo de um regex inteiro;
+    viram um grupo com flags locais, (?i:...), que funciona em qualquer posição.
+    """
+    corpo = padrao[1:-1]
+    # Grupos nomeados e retrovisores mudariam de sentido dentro do regex combinado.
+    if RE_REGRA_GRUPOS.search(corpo):
+        return None
+    flags = RE_REGRA_FLAGS.match(corpo)
+    if flags:
+        letras = "".join(dict.fromkeys(re.sub(r'[(?)]', '', flags.group(1))))
+        corpo = f"(?{letras}:{corpo[flags.end():]})"
+    else:
+        corpo = f"(?:{corpo})"
+    try:
+        re.compile("^(?=.*?" + corpo + ")", re.I | re.S)
+    except re.error:
+        return None
+    return corpo
+
+def _regex_trie(palavras):
+    """Regex com prefixos compartilhados (trie) que casa a palavra mais longa do conjunto."""
+    trie = {}
+    for palavra in palavras:
+        no = trie
+        for ch in palavra:
+            no = no.setdefault(ch, {})
+        no[''] = {}
+    def montar(no):
+        ramos = [re.escape(ch) + montar(filho) for ch, filho in sorted(no.items()) if ch]
+        if not ramos:
+            return ''
+        corpo = ramos[0] if len(ramos) == 1 else '(?:' + '|'.join(ramos) + ')'
+        return f'(?:{corpo})?' if '' in no else corpo
+    return montar(trie)
+
+class RegrasCategorizacao:
+    """Regras da tabela config_regras compiladas num único casador.
+
+    As palavras-chave viram um só regex em forma de trie, percorrido uma vez
+    por descrição distinta; as regras /regex/ viram lookaheads com grupos
+    nomeados num segundo regex. O resultado é uma matriz linhas x regras, na
+    qual valor, tipo e conta são filtrados de forma vetorizada; vale a
+    primeira regra (ordem da tabela) que atende a tudo.
+    """
+    def __init__(self, df_regras):
+        df = df_regras.reindex(columns=COLUNAS_REGRAS).reset_index(drop=True)
+        self.invalidas = []
+        padroes = [_texto(p).strip() for p in df['Padrão'].tolist()]
+        corpos = {}
+        for i, padrao in enumerate(padroes):
+            if len(padrao) > 2 and padrao.startswith('/') and padrao.endswith('/'):
+                corpo = _corpo_regex(padrao)
+                if corpo is None:
+                    self.invalidas.append(i)
+                else:
+                    corpos[i] = corpo
+        partes = [f"(?:(?=.*?(?P<r{k}>{corpo})))?" for k, corpo in enumerate(corpos.values())]
+        try:
+            self._regex = re.compile("^" + "".join(partes), re.I | re.S) if partes else None
+        except re.error:
+            # Cada regra compila sozinha; se ainda assim o conjunto falhar, nenhuma /regex/ é usada.
+            self.invalidas.extend(corpos)
+            self.invalidas.sort()
+            corpos, self._regex = {}, None
+        validas, vazias, por_palavra, self._cols_regex = [], [], {}, []
+        for i, padrao in enumerate(padroes):
+            if i in self.invalidas:
+                continue
+            if i in corpos:
+                self._cols_regex.append(len(validas))
+            elif padrao:
+                por_palavra.setdefault(padrao.lower(), []).append(len(validas))
+            else:
+                vazias.append(len(validas))
+            validas.append(i)
+        self._posicoes = np.array(validas, dtype=int)
+        self.regras = df.iloc[validas].reset_index(drop=True)
+        self._vazias = vazias
+        # Uma palavra encontrada também implica todas as palavras-chave que são prefixo dela.
+        self._cols_palavra = {
+            p: [c for q, cols in por_palavra.items() if p.startswith(q) for c in cols] for p in por_palavra
+        }
+        self._trie = re.compile("(?=(" + _regex_trie(por_palavra) + "))") if por_palavra else None
+        self._tipo = self.regras['Tipo'].map(_texto).to_numpy()
+        self._conta = self.regras['Conta'].map(_texto).to_numpy()
+        self._min = _valores_extrato(self.regras['Valor_Min']).fillna(-np.inf).to_numpy()
+        self._max = _valores_extrato(self.regras['Valor_Max']).fillna(np.inf).to_numpy()
+
+    def __len__(self):
+        return len(self.regras)
+
+    def _casamentos(self, descricoes):
+        """Matriz booleana (linhas x regras) de quais padrões aparecem em cada descrição."""
+        codigos, unicas = pd.factorize(descricoes.fillna("").astype(str))
+        casou = np.zeros((len(unicas), len(self)), dtype=bool)
+        casou[:, self._vazias] = True
+        if self._trie is not None:
+            for k, desc in enumerate(unicas):
+                for m in self._trie.finditer(desc.lower()):
+                    casou[k, self._cols_palavra[m.group(1)]] = True
+        if self._regex is not None:
+            # Só as colunas das regras: os grupos do próprio usuário também viram colunas no extract.
+            nomes = [f"r{k}" for k in range(len(self._cols_regex))]
+            casou[:, self._cols_regex] = pd.Series(unicas).str.extract(self._regex)[nomes].notna().to_numpy()
+        return casou[codigos]
+
+    def sugerir(self, df, conta=None):
+        """Sugestões para cada linha de df (colunas Descrição, Valor, Tipo).
+
+        Devolve DataFrame com o mesmo índice e colunas Regra (linha na tabela de
+        regras, -1 se nenhuma casou), Categoria, Centro_Custo e Socio.
+        """
+        sugestoes = pd.DataFrame({"Regra": -1, "Categoria": "", "Centro_Custo": "", "Socio": ""}, index=df.index)
+        if not len(self) or df.empty:
+            return sugestoes
+        casou = self._casamentos(df['Descrição'])
+        valores = pd.to_numeric(df['Valor'], errors='coerce').abs().to_numpy()[:, None]
+        casou &= (valores >= self._min) & (valores <= self._max)
+        if 'Tipo' in df:
+            tipos = df['Tipo'].astype(str).to_numpy()[:, None]
+            casou &= (self._tipo == "") | (self._tipo == tipos)
+        if conta is not None:
+            casou &= (self._conta == "") | (self._conta == conta)
+        algum = casou.any(axis=1)
+        primeira = casou.argmax(axis=1)
+        sugestoes['Regra'] = np.where(algum, self._posicoes[primeira], -1)
+        for coluna in ("Categoria", "Centro_Custo", "Socio"):
+            valores_regra = self.regras[coluna].map(_texto).to_numpy()
+            sugestoes[coluna] = np.where(algum, valores_regra[primeira], "")
+        return sugestoes
+
+def aplicar_regras(grade, regras, conta=None):
+    """Preenche Categoria/Centro_Custo/Socio da grade com as sugestões das regras; devolve quantas linhas casaram."""
+    sugestoes = regras.sugerir(grade, conta)
+    for coluna in ("Categoria", "Centro_Custo", "Socio"):
+        preencher = sugestoes[coluna] != ""
+        grade.loc[preencher, coluna] = sugestoes.loc[preencher, coluna]
+    return int((sugestoes['Regra'] >= 0).sum())
 
 # ==============================================================================
 # FUNÇÕES DE HELPERS UI
 # ==============================================================================
+def alteracoes_do_editor(df, estado):
+    """Converte o estado do st.data_editor (edited/added/deleted rows) em alterações de cadastro."""
+    chaves = df.index
+    colunas = set(df.columns)
+    excluidas = {int(p) for p in estado.get("deleted_rows", [])}
+    alteracoes = []
+    for pos, campos in estado.get("edited_rows", {}).items():
+        pos = int(pos)
+        campos = {c: v for c, v in campos.items() if c in colunas}
+        if pos in excluidas or not campos:
+            continue
+        chave = chaves[pos]
+        alteracoes.append(("editar", chave, {c: df.at[chave, c] for c in campos}, campos))
+    for pos in sorted(excluidas):
+        chave = chaves[pos]
+        alteracoes.append(("excluir", chave, df.loc[chave].to_dict(), None))
+    for nova in estado.get("added_rows", []):
+        alteracoes.append(("incluir", None, None, {c: nova.get(c) for c in df.columns}))
+    return alteracoes
+
 def editor_com_salvamento(nome_session, chave_ui):
     """Cria uma tabela editável com botões explícitos de Salvar/Cancelar"""
     st.info("💡 **Instruções:** Clique na célula para **Editar**. Clique na última linha vazia para **Adicionar**. Selecione a linha e aperte 'Delete' no teclado para **Excluir**.")
     
     df_original = st.session_state[nome_session]
+    # Salvar ou descartar troca a chave do editor, o que zera as edições pendentes.
+    chave_versao = f"versao_{chave_ui}"
+    chave_editor = f"{chave_ui}_{st.session_state.get(chave_versao, 0)}"
     
     # Editor
-    df_alterado = st.data_editor(
+    st.data_editor(
         df_original,
         num_rows="dynamic",
-        key=chave_ui,
+        key=chave_editor,
+        hide_index=True,
         use_container_width=True
     )
     
-    # Verifica se houve alteração
-    if not df_alterado.equals(df_original):
+    # Só as linhas tocadas no editor: o custo acompanha a edição, não o tamanho da tabela.
+    alteracoes = alteracoes_do_editor(df_original, st.session_state.get(chave_editor, {}))
+    if alteracoes:
         col_s1, col_s2 = st.columns([1, 4])
         with col_s1:
             if st.button("💾 Salvar Mudanças", type="primary", key=f"save_{chave_ui}"):
-                st.session_state[nome_session] = df_alterado
+                alterar_cadastro(nome_session, alteracoes)
+                st.session_state[chave_versao] = st.session_state.get(chave_versao, 0) + 1
                 st.success("Dados atualizados com sucesso!")
                 st.rerun()
         with col_s2:
             if st.button("❌ Descartar", key=f"cancel_{chave_ui}"):
+                st.session_state[chave_versao] = st.session_state.get(chave_versao, 0) + 1
+                st.rerun()
+
+    with st.expander("🕘 Histórico de alterações"):
+        st.dataframe(auditoria_cadastro(nome_session), hide_index=True, use_container_width=True)
+        if st.button("↩️ Desfazer última alteração", key=f"undo_{chave_ui}"):
+            if desfazer_cadastro(nome_session) is None:
+                st.warning("Nenhuma alteração para desfazer.")
+            else:
+                st.session_state[chave_versao] = st.session_state.get(chave_versao, 0) + 1
                 st.rerun()
 
 # ==============================================================================
 # INTERFACE PRINCIPAL
 # ==============================================================================
+# Só roda pelo `streamlit run` (o script é o __main__); importar o módulo
+# (benchmarks, processos do pool de recibos) não monta a interface.
+def main():
+    st.set_page_config(page_title="Tesouraria Centro Espírita", layout="wide", page_icon="🕊️")
+    st.markdown(CSS_APP, unsafe_allow_html=True)
+    with medir("init_session"):
+        init_session()
 
-st.sidebar.title("🕊️ Tesouraria")
-menu = st.sidebar.radio("Navegação", 
-    ["Dashboard (Contas)", "Lançamentos", "Sócios & Histórico", "Conciliação Bancária", "Relatórios e Recibos", "Configurações"]
-)
+    st.sidebar.title("🕊️ Tesouraria")
+    st.sidebar.caption(st.session_state['centro'].nome)
+    paginas = ["Dashboard (Contas)", "Lançamentos", "Sócios & Histórico", "Conciliação Bancária", "Relatórios e Recibos", "Configurações"]
+    if DIAGNOSTICO or st.query_params.get("diagnostico") == "1":
+        paginas.append("Diagnóstico")
+    menu = st.sidebar.radio("Navegação", paginas)
+    obter_rastreador().rotular(pagina=menu)
 
-# --- DASHBOARD ---
-if menu == "Dashboard (Contas)":
-    st.title("Visão Geral por Conta")
-    df = st.session_state['financeiro']
-    lista_contas = st.session_state['config_contas']['Nome'].tolist()
-    
-    st.subheader("Consolidado")
-    if not df.empty:
-        total_rec = df[df['Tipo']=='Entrada']['Valor'].sum()
-        total_desp = df[df['Tipo']=='Saída']['Valor'].sum()
-        c1, c2, c3 = st.columns(3)
-        c1.metric("Receita Total", f"R$ {total_rec:,.2f}")
-        c2.metric("Despesa Total", f"R$ {total_desp:,.2f}")
-        c3.metric("Saldo Geral", f"R$ {(total_rec - total_desp):,.2f}", delta_color="normal")
-    else:
-        st.info("Sem dados.")
-    
-    st.markdown("---")
-    st.subheader("Saldos por Conta")
-    cols = st.columns(3)
-    for i, conta in enumerate(lista_contas):
-        saldo_conta = 0
-        if not df.empty:
-            ent = df[(df['Conta'] == conta) & (df['Tipo'] == 'Entrada')]['Valor'].sum()
-            sai = df[(df['Conta'] == conta) & (df['Tipo'] == 'Saída')]['Valor'].sum()
-            saldo_conta = ent - sai
-        with cols[i % 3]:
-            st.metric(label=conta, value=f"R$ {saldo_conta:,.2f}")
-
-# --- LANÇAMENTOS ---
-elif menu == "Lançamentos":
-    st.title("Novo Lançamento")
-    with st.form("form_lanc"):
-        c1, c2, c3 = st.columns(3)
-        dt = c1.date_input("Data", date.today())
-        conta_sel = c2.selectbox("Conta", st.session_state['config_contas']['Nome'].tolist())
-        tipo = c3.selectbox("Tipo", ["Entrada", "Saída"])
-        
-        c4, c5 = st.columns(2)
-        if tipo == "Entrada": cats = st.session_state['config_categorias_receita']['Nome'].tolist()
-        else: cats = st.session_state['config_categorias_despesa']['Nome'].tolist()
-        cat = c4.selectbox("Categoria", cats)
-        val = c5.number_input("Valor R$", min_value=0.01, format="%.2f")
-        
-        c6, c7 = st.columns(2)
-        cc = c6.selectbox("Centro de Custo", st.session_state['config_centros_custo']['Nome'].tolist())
-        socio = c7.selectbox("Sócio/Fornecedor", ["Não Identificado"] + st.session_state['socios']['Nome'].tolist())
-        desc = st.text_input("Descrição")
-        
-        if st.form_submit_button("Salvar Movimentação"):
-            novo = {
-                "ID": len(st.session_state['financeiro']) + 1,
-                "Data": dt, "Tipo": tipo, "Conta": conta_sel, "Categoria": cat, "Centro_Custo": cc,
-                "Descrição": desc, "Valor": val, "Socio": socio, "Conciliado": "Manual"
-            }
-            st.session_state['financeiro'] = pd.concat([st.session_state['financeiro'], pd.DataFrame([novo])], ignore_index=True)
-            st.success("Lançamento Registrado!")
-
-# --- SÓCIOS ---
-elif menu == "Sócios & Histórico":
-    st.title("Gestão de Sócios")
-    tab1, tab2 = st.tabs(["Cadastro (Editar/Excluir/Adicionar)", "Histórico Financeiro"])
-    with tab1:
-        st.subheader("Tabela de Sócios")
-        # Implementação da função com botão salvar
-        editor_com_salvamento('socios', 'editor_socio_main')
-        
-    with tab2:
-        soc = st.selectbox("Selecione Sócio", st.session_state['socios']['Nome'].unique())
-        df_hist = st.session_state['financeiro']
-        filtro = df_hist[df_hist['Socio'] == soc]
-        if not filtro.empty:
-            st.dataframe(filtro)
+    # --- DASHBOARD ---
+    if menu == "Dashboard (Contas)":
+        st.title("Visão Geral por Conta")
+        saldos = st.session_state['financeiro'].saldos
+        lista_contas = st.session_state['config_contas']['Nome'].tolist()
+
+        st.subheader("Consolidado")
+        if saldos.quantidade:
+            total_rec = saldos.total('Entrada')
+            total_desp = saldos.total('Saída')
+            c1, c2, c3 = st.columns(3)
+            c1.metric("Receita Total", f"R$ {total_rec:,.2f}")
+            c2.metric("Despesa Total", f"R$ {total_desp:,.2f}")
+            c3.metric("Saldo Geral", f"R$ {(total_rec - total_desp):,.2f}", delta_color="normal")
         else:
-            st.warning("Sem histórico para este sócio.")
+            st.info("Sem dados.")
 
-# --- CONCILIAÇÃO ---
-elif menu == "Conciliação Bancária":
-    st.title("Importar Extrato")
-    conta_destino = st.selectbox("Para qual conta importar?", st.session_state['config_contas']['Nome'].tolist())
-    arquivo = st.file_uploader("Arquivo (OFX, PDF, Excel, CSV)", type=['ofx','pdf','xlsx','csv'])
-    
-    if arquivo:
-        df_imp = pd.DataFrame()
-        if arquivo.name.endswith('.ofx'): df_imp = parse_ofx(arquivo)
-        elif arquivo.name.endswith('.pdf'): df_imp = parse_pdf_extrato(arquivo)
-        elif arquivo.name.endswith('.xlsx'): df_imp = pd.read_excel(arquivo)
-        elif arquivo.name.endswith('.csv'): df_imp = pd.read_csv(arquivo)
-        
-        if not df_imp.empty:
-            with st.form("conciliacao"):
-                processar = []
-                for i, row in df_imp.head(10).iterrows():
-                    val = row.get('Valor', 0)
-                    tipo = "Entrada" if val > 0 else "Saída"
-                    st.markdown(f"**{row.get('Data')}** | R$ {val} | {row.get('Descrição')}")
-                    col_a, col_b = st.columns(2)
-                    cats = st.session_state['config_categorias_receita']['Nome'].tolist() if tipo == "Entrada" else st.session_state['config_categorias_despesa']['Nome'].tolist()
-                    cat_sel = col_a.selectbox("Categoria", ["Ignorar"] + cats, key=f"c_{i}")
-                    soc_sel = col_b.selectbox("Sócio", ["N/A"] + st.session_state['socios']['Nome'].tolist(), key=f"s_{i}")
-                    st.divider()
-                    processar.append({"Data": row.get('Data'), "Valor": abs(val), "Tipo": tipo, "Conta": conta_destino, "Categoria": cat_sel, "Socio": soc_sel, "Descrição": row.get('Descrição'), "CC": "Geral"})
-                
-                if st.form_submit_button("Confirmar Importação"):
-                    for p in processar:
-                        if p['Categoria'] != "Ignorar":
-                            novo = {
-                                "ID": len(st.session_state['financeiro']) + 1,
-                                "Data": p['Data'], "Tipo": p['Tipo'], "Conta": p['Conta'], "Categoria": p['Categoria'], "Centro_Custo": p['CC'], "Descrição": p['Descrição'], "Valor": p['Valor'], "Socio": p['Socio'], "Conciliado": "Auto"
-                            }
-                            st.session_state['financeiro'] = pd.concat([st.session_state['financeiro'], pd.DataFrame([novo])], ignore_index=True)
-                    st.success("Conciliado!")
-
-# --- RELATÓRIOS E RECIBOS ---
-elif menu == "Relatórios e Recibos":
-    st.title("Relatórios e Recibos")
-    tab_recibos, tab_relatorios, tab_balancete = st.tabs(["🧾 Emissão de Recibos", "📊 Relatórios Detalhados", "⚖️ Balancete"])
-    
-    with tab_recibos:
-        st.subheader("Gerenciar Recibos (Entradas)")
-        df = st.session_state['financeiro']
-        df_entradas = df[df['Tipo'] == "Entrada"].copy()
-        if not df_entradas.empty:
-            df_entradas.insert(0, "Selecionar", False)
-            df_editado = st.data_editor(df_entradas, column_config={"Selecionar": st.column_config.CheckboxColumn(required=True)}, disabled=["ID","Data","Tipo","Conta","Categoria","Valor","Socio"], hide_index=True, use_container_width=True)
-            selecionados = df_editado[df_editado['Selecionar'] == True]
-            
-            st.markdown("---")
-            c_act1, c_act2 = st.columns(2)
-            with c_act1:
-                if not selecionados.empty:
-                    pdf_uni = gerar_recibos_unificados_pdf(selecionados)
-                    st.download_button("📂 Baixar PDF Unificado", data=pdf_uni, file_name="recibos_unificados.pdf", mime="application/pdf")
-            with c_act2:
-                if not selecionados.empty:
-                    st.subheader("Envio Individual")
-                    for idx, row in selecionados.iterrows():
-                        tel_info = st.session_state['socios'].loc[st.session_state['socios']['Nome'] == row['Socio'], 'Telefone']
-                        telefone = tel_info.values[0] if not tel_info.empty else ""
-                        num_limpo = ''.join(filter(str.isdigit, str(telefone)))
-                        
-                        cz1, cz2 = st.columns([3, 1])
-                        cz1.write(f"ID {row['ID']} - {row['Socio']}")
-                        if len(num_limpo) >= 10:
-                            link = f"https://wa.me/55{num_limpo}?text=Ola, segue seu recibo referente a {row['Categoria']}."
-                            cz2.markdown(f"[📲 Zap]({link})", unsafe_allow_html=True)
-                        else: cz2.caption("Sem Tel")
-                        pdf_single = gerar_recibo_unico_pdf(row)
-                        cz2.download_button("⬇️", data=pdf_single, file_name=f"rec_{row['ID']}.pdf", mime="application/pdf", key=f"btn_{row['ID']}")
-        else: st.info("Nenhuma entrada registrada.")
-
-    with tab_relatorios:
-        st.subheader("Filtros")
-        c1, c2 = st.columns(2)
-        d_ini = c1.date_input("Início", date(date.today().year, 1, 1))
-        d_fim = c2.date_input("Fim", date.today())
-        
-        df_full = st.session_state['financeiro']
-        df_full['Data'] = pd.to_datetime(df_full['Data']).dt.date
-        mask = (df_full['Data'] >= d_ini) & (df_full['Data'] <= d_fim)
-        df_filt = df_full.loc[mask]
-        
-        tipo_view = st.radio("Visualizar:", ["Detalhado", "Resumo Categoria", "Resumo Centro Custo"], horizontal=True)
-        
-        if not df_filt.empty:
-            if tipo_view == "Detalhado":
-                st.dataframe(df_filt)
-                pdf_det = gerar_relatorio_pdf(df_filt, "Relatório Detalhado")
-                st.download_button("Baixar PDF Detalhado", data=pdf_det, file_name="rel_detalhado.pdf", mime="application/pdf")
-            elif tipo_view == "Resumo Categoria":
-                resumo = df_filt.groupby(['Tipo', 'Categoria'])['Valor'].sum().reset_index()
-                st.dataframe(resumo, use_container_width=True)
-                st.bar_chart(resumo, x="Categoria", y="Valor", color="Tipo")
-            elif tipo_view == "Resumo Centro Custo":
-                resumo_cc = df_filt.groupby(['Centro_Custo', 'Tipo'])['Valor'].sum().reset_index()
-                st.dataframe(resumo_cc, use_container_width=True)
-        else: st.warning("Sem dados.")
-
-    with tab_balancete:
-        st.subheader("Balancete Financeiro")
-        df_bal = st.session_state['financeiro']
-        if not df_bal.empty:
-            entradas_total = df_bal[df_bal['Tipo'] == "Entrada"]['Valor'].sum()
-            saidas_total = df_bal[df_bal['Tipo'] == "Saída"]['Valor'].sum()
-            col_b1, col_b2 = st.columns(2)
-            col_b1.metric("Total Entradas", f"R$ {entradas_total:,.2f}")
-            col_b2.metric("Total Saídas", f"R$ {saidas_total:,.2f}")
-            st.divider()
-            st.write("**Detalhamento por Conta**")
-            saldo_por_conta = []
-            for conta in st.session_state['config_contas']['Nome'].tolist():
-                e = df_bal[(df_bal['Conta']==conta) & (df_bal['Tipo']=='Entrada')]['Valor'].sum()
-                s = df_bal[(df_bal['Conta']==conta) & (df_bal['Tipo']=='Saída')]['Valor'].sum()
-                saldo_por_conta.append({"Conta": conta, "Entradas": e, "Saídas": s, "Saldo Final": e - s})
-            st.dataframe(pd.DataFrame(saldo_por_conta))
-
-# --- CONFIGURAÇÕES ---
-elif menu == "Configurações":
-    st.title("⚙️ Cadastros Básicos")
-    t1, t2, t3, t4 = st.tabs(["Contas Bancárias", "Categorias Receita", "Categorias Despesa", "Centros de Custo"])
-    with t1: editor_com_salvamento('config_contas', 'cfg_conta')
-    with t2: editor_com_salvamento('config_categorias_receita', 'cfg_rec')
-    with t3: editor_com_salvamento('config_categorias_despesa', 'cfg_desp')
-    with t4: editor_com_salvamento('config_centros_custo', 'cfg_cc')
+        st.markdown("---")
+        st.subheader("Saldos por Conta")
+        cols = st.columns(3)
+        for i, conta in enumerate(lista_contas):
+            saldo_conta = saldos.total('Entrada', conta) - saldos.total('Saída', conta)
+            with cols[i % 3]:
+                st.metric(label=conta, value=f"R$ {saldo_conta:,.2f}")
+
+    # --- LANÇAMENTOS ---
+    elif menu == "Lançamentos":
+        st.title("Novo Lançamento")
+        with st.form("form_lanc"):
+            c1, c2, c3 = st.columns(3)
+            dt = c1.date_input("Data", date.today())
+            conta_sel = c2.selectbox("Conta", st.session_state['config_contas']['Nome'].tolist())
+            tipo = c3.selectbox("Tipo", ["Entrada", "Saída"])
+
+            c4, c5 = st.columns(2)
+            if tipo == "Entrada": cats = st.session_state['config_categorias_receita']['Nome'].tolist()
+            else: cats = st.session_state['config_categorias_despesa']['Nome'].tolist()
+            cat = c4.selectbox("Categoria", cats)
+            val = c5.number_input("Valor R$", min_value=0.01, format="%.2f")
+
+            c6, c7 = st.columns(2)
+            cc = c6.selectbox("Centro de Custo", st.session_state['config_centros_custo']['Nome'].tolist())
+            socio = c7.selectbox("Sócio/Fornecedor", ["Não Identificado"] + indice_socios().nomes)
+            desc = st.text_input("Descrição")
+
+            if st.form_submit_button("Salvar Movimentação"):
+                novo = {
+                    "Data": dt, "Tipo": tipo, "Conta": conta_sel, "Categoria": cat, "Centro_Custo": cc,
+                    "Descrição": desc, "Valor": val, "Socio": socio, "Conciliado": "Manual"
+                }
+                try:
+                    st.session_state['financeiro'].append(novo)
+                    st.success("Lançamento Registrado!")
+                except ValueError as erro:
+                    st.error(str(erro))
+
+    # --- SÓCIOS ---
+    elif menu == "Sócios & Histórico":
+        st.title("Gestão de Sócios")
+        tab1, tab2 = st.tabs(["Cadastro (Editar/Excluir/Adicionar)", "Histórico Financeiro"])
+        with tab1:
+            st.subheader("Tabela de Sócios")
+            # Implementação da função com botão salvar
+            editor_com_salvamento('socios', 'editor_socio_main')
+
+        with tab2:
+            indice = indice_socios()
+            soc = st.selectbox("Selecione Sócio", indice.nomes_unicos)
+            filtro = indice.historico(soc)
+            if not filtro.empty:
+                st.dataframe(filtro)
+            else:
+                st.warning("Sem histórico para este sócio.")
+
+    # --- CONCILIAÇÃO ---
+    elif menu == "Conciliação Bancária":
+        st.title("Importar Extrato")
+        conta_destino = st.selectbox("Para qual conta importar?", st.session_state['config_contas']['Nome'].tolist())
+        arquivo = st.file_uploader("Arquivo (OFX, PDF, Excel, CSV)", type=['ofx','pdf','xlsx','csv'])
+
+        if arquivo:
+            hash_arquivo = _hash_conteudo(_ler_conteudo(arquivo))
+            lido = st.session_state.get('extrato_lido')
+            if lido is None or lido[0] != hash_arquivo:
+                df_lido = pd.DataFrame()
+                if arquivo.name.endswith('.ofx'): df_lido = parse_ofx(arquivo)
+                elif arquivo.name.endswith('.pdf'): df_lido = parse_pdf_extrato(arquivo)
+                elif arquivo.name.lower().endswith(('.xlsx', '.csv')): df_lido = parse_tabela_extrato(arquivo)
+                lido = (hash_arquivo, df_lido)
+                st.session_state['extrato_lido'] = lido
+            df_imp = lido[1]
+            # OFX com várias contas: importa uma por vez, na conta de destino escolhida acima.
+            contas_extrato = df_imp['Conta_Extrato'].unique().tolist() if 'Conta_Extrato' in df_imp else []
+            conta_extrato = None
+            if len(contas_extrato) > 1:
+                conta_extrato = st.selectbox("O arquivo traz várias contas. Qual importar?", contas_extrato,
+                                             format_func=lambda c: c or "(sem identificação)")
+                df_imp = df_imp[df_imp['Conta_Extrato'] == conta_extrato]
+            chave_imp = (hash_arquivo, conta_destino, conta_extrato)
+            imp = st.session_state.get('importacao')
+            if imp is None or imp['chave'] != chave_imp:
+                # Concilia e monta a grade uma vez por arquivo/conta; as interações seguintes só editam a grade.
+                # Cada grade montada ganha um número próprio, usado na chave dos editores: com linhas fixas o
+                # Streamlit reconhece o editor pela forma da página e reaplicaria as edições da importação anterior.
+                st.session_state['importacoes'] = st.session_state.get('importacoes', 0) + 1
+                imp = {'chave': chave_imp, 'vazio': df_imp.empty, 'serie': st.session_state['importacoes'], 'rodada': 0}
+                if not df_imp.empty:
+                    extrato, pendentes = conciliar_extrato(st.session_state['financeiro'], df_imp, conta_destino)
+                    grade = montar_grade_importacao(extrato)
+                    regras = RegrasCategorizacao(st.session_state['config_regras'])
+                    imp.update({
+                        'extrato': extrato, 'pendentes': pendentes,
+                        'conciliadas': extrato[extrato['Situação'] == "Conciliado"],
+                        'grade': grade,
+                        'por_regra': aplicar_regras(grade, regras, conta_destino),
+                        'regras_invalidas': regras.invalidas,
+                    })
+                st.session_state['importacao'] = imp
+
+            if not imp['vazio']:
+                extrato, pendentes, conciliadas, grade = imp['extrato'], imp['pendentes'], imp['conciliadas'], imp['grade']
+                if imp['regras_invalidas']:
+                    st.warning(f"Regras com regex inválido foram ignoradas (linhas {', '.join(str(i + 1) for i in imp['regras_invalidas'])}).")
+                m1, m2, m3, m4, m5 = st.columns(5)
+                m1.metric("Novas", len(grade))
+                m2.metric("Já no livro", int((extrato['Situação'] == "Duplicado").sum()))
+                m3.metric("Pareadas com manuais", len(conciliadas))
+                m4.metric("Manuais sem par", len(pendentes))
+                m5.metric("Sugeridas por regra", imp['por_regra'])
+                if not conciliadas.empty:
+                    with st.expander("Linhas do extrato pareadas com lançamentos manuais"):
+                        st.dataframe(conciliadas[['Data', 'Valor', 'Descrição', 'ID_Livro']], hide_index=True, use_container_width=True)
+                if not pendentes.empty:
+                    with st.expander("Lançamentos manuais do período sem par no extrato"):
+                        st.dataframe(pendentes, hide_index=True, use_container_width=True)
+
+                cats_rec = st.session_state['config_categorias_receita']['Nome'].tolist()
+                cats_desp = st.session_state['config_categorias_despesa']['Nome'].tolist()
+                nomes_socios = ["N/A"] + indice_socios().nomes
+                centros = st.session_state['config_centros_custo']['Nome'].tolist()
+
+                with st.expander("⚡ Categorizar em massa", expanded=False):
+                    b1, b2, b3 = st.columns(3)
+                    trecho = b1.text_input("Descrição contém")
+                    cat_massa = b2.selectbox("Categoria", ["(manter)", "Ignorar"] + cats_rec + cats_desp, key="massa_cat")
+                    soc_massa = b3.selectbox("Sócio", ["(manter)"] + nomes_socios, key="massa_soc")
+                    if st.button("Aplicar às linhas correspondentes"):
+                        tipos = None
+                        if cat_massa in cats_rec and cat_massa not in cats_desp: tipos = ["Entrada"]
+                        elif cat_massa in cats_desp and cat_massa not in cats_rec: tipos = ["Saída"]
+                        n = aplicar_em_massa(
+                            grade, trecho,
+                            categoria=None if cat_massa == "(manter)" else cat_massa,
+                            socio=None if soc_massa == "(manter)" else soc_massa,
+                            tipos=tipos
+                        )
+                        # Editor novo: o anterior reaplicaria suas edições por cima dos valores em massa.
+                        imp['rodada'] += 1
+                        st.success(f"{n} linha(s) atualizada(s).")
+
+                if grade.empty:
+                    st.info("Nenhuma linha nova neste extrato.")
+                else:
+                    p1, p2 = st.columns([1, 3])
+                    por_pagina = p1.selectbox("Linhas por página", [50, 100, 200], index=1)
+                    paginas = max(1, -(-len(grade) // por_pagina))
+                    pagina = p2.number_input(f"Página (de {paginas})", min_value=1, max_value=paginas, value=1, step=1)
+                    ini = (pagina - 1) * por_pagina
+                    trecho_grade = grade.iloc[ini:ini + por_pagina]
+                    editado = st.data_editor(
+                        trecho_grade,
+                        column_config={
+                            "Categoria": st.column_config.SelectboxColumn(options=["Ignorar"] + cats_rec + cats_desp, required=True),
+                            "Socio": st.column_config.SelectboxColumn("Sócio", options=nomes_socios, required=True),
+                            "Centro_Custo": st.column_config.SelectboxColumn("Centro de Custo", options=centros, required=True),
+                            "Ref_Extrato": None,
+                        },
+                        disabled=["Data", "Descrição", "Valor", "Tipo"],
+                        hide_index=True, use_container_width=True,
+                        key=f"grade_imp_{imp['serie']}_{imp['rodada']}_{pagina}_{por_pagina}"
+                    )
+                    # Só a página visível é comparada e copiada de volta para a grade.
+                    mudou = (editado[COLUNAS_GRADE_EDITAVEIS] != trecho_grade[COLUNAS_GRADE_EDITAVEIS]).any(axis=1)
+                    if mudou.any():
+                        grade.loc[mudou[mudou].index, COLUNAS_GRADE_EDITAVEIS] = editado.loc[mudou, COLUNAS_GRADE_EDITAVEIS]
+
+                a_importar = int((grade['Categoria'] != "Ignorar").sum())
+                if st.button(f"Confirmar Importação ({a_importar} novas, {len(conciliadas)} pareadas)", type="primary"):
+                    livro = st.session_state['financeiro']
+                    novos = lancamentos_da_grade(grade, conta_destino)
+                    try:
+                        # Confere os meses antes de gravar, para não marcar as pareadas e barrar as novas.
+                        livro.conferir_aberto(novos)
+                        # Lançamentos manuais confirmados pelo extrato são marcados, não duplicados.
+                        livro.atualizar_varios({
+                            int(r.ID_Livro): {"Conciliado": "Extrato", "Ref_Extrato": r.Ref_Extrato} for r in conciliadas.itertuples()
+                        })
+                        livro.append_many(novos)
+                    except ValueError as erro:
+                        st.error(str(erro))
+                    else:
+                        st.session_state.pop('importacao', None)
+                        st.success("Conciliado!")
+
+    # --- RELATÓRIOS E RECIBOS ---
+    elif menu == "Relatórios e Recibos":
+        st.title("Relatórios e Recibos")
+        tab_recibos, tab_relatorios, tab_balancete, tab_fechamento = st.tabs(["🧾 Emissão de Recibos", "📊 Relatórios Detalhados", "⚖️ Balancete", "🔒 Fechamento"])
+
+        with tab_recibos:
+            st.subheader("Gerenciar Recibos (Entradas)")
+            df_entradas = st.session_state['financeiro'].consultar(tipo="Entrada").copy()
+            if not df_entradas.empty:
+                df_entradas.insert(0, "Selecionar", False)
+                df_editado = st.data_editor(df_entradas, column_config={"Selecionar": st.column_config.CheckboxColumn(required=True)}, disabled=["ID","Data","Tipo","Conta","Categoria","Valor","Socio"], hide_index=True, use_container_width=True)
+                selecionados = df_editado[df_editado['Selecionar'] == True]
+
+                st.markdown("---")
+                c_act1, c_act2 = st.columns(2)
+                with c_act1:
+                    if not selecionados.empty:
+                        # Os PDFs só são gerados quando o botão é clicado.
+                        st.download_button("📂 Baixar PDF Unificado", data=partial(gerar_recibos_unificados_pdf, selecionados, st.session_state['centro']), file_name="recibos_unificados.pdf", mime="application/pdf")
+                        st.download_button("🗜️ Baixar ZIP (um PDF por recibo)", data=partial(gerar_zip_recibos, selecionados, st.session_state['centro']), file_name="recibos.zip", mime="application/zip")
+                with c_act2:
+                    if not selecionados.empty:
+                        st.subheader("Envio Individual")
+                        indice = indice_socios()
+                        for idx, row in selecionados.iterrows():
+                            num_limpo = indice.telefone(row['Socio'])
+
+                            cz1, cz2 = st.columns([3, 1])
+                            cz1.write(f"ID {row['ID']} - {row['Socio']}")
+                            if len(num_limpo) >= 10:
+                                link = f"https://wa.me/55{num_limpo}?text=Ola, segue seu recibo referente a {row['Categoria']}."
+                                cz2.markdown(f"[📲 Zap]({link})", unsafe_allow_html=True)
+                            else: cz2.caption("Sem Tel")
+                            cz2.download_button("⬇️", data=partial(gerar_recibo_unico_pdf, row, st.session_state['centro']), file_name=f"rec_{row['ID']}.pdf", mime="application/pdf", key=f"btn_{row['ID']}")
+            else: st.info("Nenhuma entrada registrada.")
+
+        with tab_relatorios:
+            st.subheader("Filtros")
+            c1, c2 = st.columns(2)
+            d_ini = c1.date_input("Início", date(date.today().year, 1, 1))
+            d_fim = c2.date_input("Fim", date.today())
+
+            motor = st.session_state['financeiro'].relatorios
+            df_filt = motor.periodo(d_ini, d_fim)
+
+            tipo_view = st.radio("Visualizar:", ["Detalhado", "Resumo Categoria", "Resumo Centro Custo"], horizontal=True)
+
+            if not df_filt.empty:
+                if tipo_view == "Detalhado":
+                    st.dataframe(df_filt, column_config={"Data": st.column_config.DateColumn(format="DD/MM/YYYY")})
+                    st.download_button("Baixar PDF Detalhado", data=partial(motor.pdf_periodo, d_ini, d_fim, "Relatório Detalhado", st.session_state['centro']), file_name="rel_detalhado.pdf", mime="application/pdf")
+                elif tipo_view == "Resumo Categoria":
+                    resumo = motor.resumo(d_ini, d_fim, ['Tipo', 'Categoria'])
+                    st.dataframe(resumo, use_container_width=True)
+                    st.bar_chart(resumo, x="Categoria", y="Valor", color="Tipo")
+                elif tipo_view == "Resumo Centro Custo":
+                    resumo_cc = motor.resumo(d_ini, d_fim, ['Centro_Custo', 'Tipo'])
+                    st.dataframe(resumo_cc, use_container_width=True)
+            else: st.warning("Sem dados.")
+
+        with tab_balancete:
+            st.subheader("Balancete Financeiro")
+            saldos_bal = st.session_state['financeiro'].saldos
+            if saldos_bal.quantidade:
+                entradas_total = saldos_bal.total("Entrada")
+                saidas_total = saldos_bal.total("Saída")
+                col_b1, col_b2 = st.columns(2)
+                col_b1.metric("Total Entradas", f"R$ {entradas_total:,.2f}")
+                col_b2.metric("Total Saídas", f"R$ {saidas_total:,.2f}")
+                st.divider()
+                st.write("**Detalhamento por Conta**")
+                fechado_ate = st.session_state['financeiro'].fechado_ate
+                if fechado_ate:
+                    # Saldo no último fechamento + movimento do período aberto.
+                    fechados = st.session_state['financeiro'].saldos_fechados()
+                    fechados = fechados.assign(Saldo=fechados['Valor'].where(fechados['Tipo'] == "Entrada", -fechados['Valor']))
+                    saldo_fechado = fechados.groupby('Conta')['Saldo'].sum()
+                saldo_por_conta = []
+                for conta in st.session_state['config_contas']['Nome'].tolist():
+                    e = saldos_bal.total('Entrada', conta)
+                    s = saldos_bal.total('Saída', conta)
+                    linha = {"Conta": conta, "Entradas": e, "Saídas": s, "Saldo Final": e - s}
+                    if fechado_ate:
+                        linha = {"Conta": conta, f"Saldo em {_mes_br(fechado_ate)}": saldo_fechado.get(conta, 0.0),
+                                 "Movimento em Aberto": e - s - saldo_fechado.get(conta, 0.0), **linha}
+                    saldo_por_conta.append(linha)
+                st.dataframe(pd.DataFrame(saldo_por_conta))
+
+        with tab_fechamento:
+            st.subheader("Fechamento de Períodos")
+            livro = st.session_state['financeiro']
+            fechado_ate = livro.fechado_ate
+            st.caption("Fechar um mês guarda os totais por conta e categoria e bloqueia inclusões, edições e exclusões "
+                       "de lançamentos até o fim dele. Para o fechamento anual, feche até dezembro.")
+            if fechado_ate: st.info(f"Livro fechado até {_mes_br(fechado_ate)}.")
+            else: st.info("Nenhum mês fechado.")
+
+            meses_livro = [m for m in livro.saldos.tabela()['Mes'] if m]
+            ultimo = (pd.Period(date.today(), freq='M') - 1).strftime('%Y-%m')
+            inicio = _proximo_mes(fechado_ate) if fechado_ate else min(meses_livro, default=ultimo)
+            abertos = _meses_entre(inicio, ultimo) if inicio <= ultimo else []
+            if abertos:
+                with st.form("form_fechamento"):
+                    mes_fechar = st.selectbox("Fechar até", list(reversed(abertos)), format_func=_mes_br)
+                    if st.form_submit_button("🔒 Fechar período"):
+                        try:
+                            livro.fechar(mes_fechar)
+                        except ValueError as erro:
+                            st.error(str(erro))
+                        else:
+                            st.rerun()
+
+            fechamentos = livro.fechamentos()
+            if not fechamentos.empty:
+                fechados = livro.saldos_fechados()
+                por_mes = fechados.pivot_table(index='Mes', columns='Tipo', values='Valor', aggfunc='sum', fill_value=0.0)
+                por_mes = por_mes.reindex(columns=["Entrada", "Saída"], fill_value=0.0)
+                resumo_fech = fechamentos.set_index('Mes').join(por_mes).fillna({"Entrada": 0.0, "Saída": 0.0})
+                resumo_fech['Resultado'] = resumo_fech['Entrada'] - resumo_fech['Saída']
+                resumo_fech.index = resumo_fech.index.map(_mes_br)
+                st.dataframe(resumo_fech.iloc[::-1], use_container_width=True)
+                with st.form("form_reabertura"):
+                    mes_reabrir = st.selectbox("Reabrir a partir de", list(reversed(fechamentos['Mes'].tolist())), format_func=_mes_br)
+                    if st.form_submit_button("🔓 Reabrir"):
+                        livro.reabrir(mes_reabrir)
+                        st.rerun()
+
+    # --- CONFIGURAÇÕES ---
+    elif menu == "Configurações":
+        st.title("⚙️ Cadastros Básicos")
+        t1, t2, t3, t4, t5, t6 = st.tabs(["Contas Bancárias", "Categorias Receita", "Categorias Despesa", "Centros de Custo", "Regras de Categorização", "Centro"])
+        with t1: editor_com_salvamento('config_contas', 'cfg_conta')
+        with t2: editor_com_salvamento('config_categorias_receita', 'cfg_rec')
+        with t3: editor_com_salvamento('config_categorias_despesa', 'cfg_desp')
+        with t4: editor_com_salvamento('config_centros_custo', 'cfg_cc')
+        with t5:
+            st.caption("Aplicadas na importação de extratos, de cima para baixo: vale a primeira regra que casar. "
+                       "**Padrão** é um trecho da descrição ou um regex entre barras (ex.: `/luz|energia/`). "
+                       "Tipo, Conta, Valor_Min e Valor_Max vazios não restringem; Categoria, Centro_Custo e Socio vazios não são preenchidos.")
+            editor_com_salvamento('config_regras', 'cfg_regras')
+        with t6:
+            centro = st.session_state['centro']
+            if not ARQUIVO_BANCO:
+                st.info("Sem banco de dados configurado, o centro usa a identidade padrão nos documentos.")
+            else:
+                banco = obter_banco(ARQUIVO_BANCO)
+                with st.form("form_centro"):
+                    st.caption(f"Código: `{centro.codigo}`")
+                    nome_centro = st.text_input("Nome impresso nos documentos", centro.nome)
+                    whatsapp = st.text_input("WhatsApp da tesouraria", centro.whatsapp)
+                    if st.form_submit_button("Salvar"):
+                        banco.salvar_centro(Centro(centro.codigo, nome_centro, whatsapp))
+                        st.rerun()
+                if CHAVE_ADMIN:
+                    st.subheader("Administração dos centros")
+                    if not sessao_admin():
+                        with st.form("form_admin"):
+                            chave_admin = st.text_input("Chave de administrador", type="password")
+                            if st.form_submit_button("Entrar"):
+                                st.session_state['chave_admin'] = chave_admin
+                                if not sessao_admin():
+                                    st.error("Chave inválida.")
+                                else:
+                                    st.rerun()
+                    else:
+                        # A chave só aparece aqui, uma vez: o banco guarda apenas o hash.
+                        with st.form("form_novo_centro", clear_on_submit=True):
+                            st.markdown("**Cadastrar novo centro**")
+                            codigo = st.text_input("Código (letras minúsculas, números e hífen)")
+                            nome_novo = st.text_input("Nome")
+                            whatsapp_novo = st.text_input("WhatsApp da tesouraria")
+                            if st.form_submit_button("Cadastrar"):
+                                if not re.fullmatch(r'[a-z0-9-]+', codigo):
+                                    st.error("Código inválido.")
+                                elif banco.centro(codigo) is not None:
+                                    st.error("Já existe um centro com esse código.")
+                                else:
+                                    banco.salvar_centro(Centro(codigo, nome_novo or "Centro Espírita", whatsapp_novo))
+                                    st.success("Centro cadastrado. Envie este endereço à tesouraria do centro:")
+                                    st.code(link_centro(codigo, banco.nova_chave(codigo)))
+                        centros_cad = [c.codigo for c in banco.centros() if c.codigo != CENTRO_PADRAO]
+                        if centros_cad:
+                            with st.form("form_chave_centro"):
+                                st.markdown("**Novo link de acesso** (o anterior deixa de funcionar)")
+                                codigo_link = st.selectbox("Centro", centros_cad)
+                                if st.form_submit_button("Gerar link"):
+                                    st.code(link_centro(codigo_link, banco.nova_chave(codigo_link)))
+                        st.dataframe(pd.DataFrame([vars(c) for c in banco.centros()]), hide_index=True, use_container_width=True)
+
+    # --- DIAGNÓSTICO ---
+    elif menu == "Diagnóstico":
+        st.title("🩺 Diagnóstico")
+        rastreador = obter_rastreador()
+        ativo = st.toggle("Coletar medições", value=rastreador.ativo, help="Vale para o processo inteiro, não só para esta sessão.")
+        if ativo != rastreador.ativo:
+            rastreador.ativo = ativo
+        spans = rastreador.tabela()
+        if spans.empty:
+            st.info("Nenhuma medição ainda. Ligue a coleta e navegue pelas páginas.")
+        else:
+            st.subheader("Tempo por página e operação")
+            resumo = (spans.groupby(["Página", "Nome"])["Duração (ms)"]
+                      .agg(Chamadas="count", Média="mean", P95=lambda d: d.quantile(0.95), Máximo="max")
+                      .reset_index().sort_values("Máximo", ascending=False))
+            st.dataframe(resumo, hide_index=True, use_container_width=True)
+            st.subheader("Últimas medições")
+            st.dataframe(spans.tail(200).iloc[::-1], hide_index=True, use_container_width=True)
+        c_d1, c_d2 = st.columns(2)
+        c_d1.download_button("⬇️ Exportar trace (chrome://tracing / Perfetto)", data=rastreador.trace_chrome,
+                             file_name=f"trace_tesouraria_{datetime.now():%Y%m%d_%H%M%S}.json", mime="application/json")
+        if c_d2.button("🗑️ Limpar medições"):
+            rastreador.limpar()
+            st.rerun()
+        st.subheader("Memória das tabelas da sessão")
+        st.dataframe(memoria_sessao(), hide_index=True, use_container_width=True)
+        st.subheader("Caches")
+        st.dataframe(estatisticas_caches(), hide_index=True, use_container_width=True)
+
+if __name__ == "__main__":
+    with medir("execucao"):
+        main()
@@ -0,0 +1,129 @@
+"""Dados sintéticos para os benchmarks: livro, sócios e extratos (OFX, PDF, CSV e Excel).
+
+Tudo sai de um gerador com semente fixa, então a mesma chamada produz sempre
+os mesmos dados e os tempos de execuções diferentes são comparáveis.
+"""
+from io import BytesIO
+
+import numpy as np
+import openpyxl
+import pandas as pd
+from fpdf import FPDF
+
+CONTAS = ["Conta Corrente (Banco)", "Caixa Físico (Espécie)"]
+CATEGORIAS = {
+    "Entrada": ["Doação Anônima", "Mensalidade", "Cantina", "Bazar", "Livros", "Eventos"],
+    "Saída": ["Energia", "Água", "Manutenção Predial", "Assistência Social", "Internet", "Material de Limpeza"],
+}
+CENTROS_CUSTO = ["Geral", "Departamento Doutrinário", "Assistência Social", "Administrativo"]
+HISTORICOS = ["PIX RECEBIDO", "PIX ENVIADO", "TED", "PAGTO BOLETO", "DEP DINHEIRO", "TARIFA", "CONTA DE LUZ", "MENSALIDADE"]
+NOMES = ["Ana", "Bruno", "Carla", "Davi", "Elisa", "Fábio", "Gisele", "Heitor", "Iara", "João", "Lúcia", "Mário"]
+SOBRENOMES = ["Silva", "Souza", "Oliveira", "Santos", "Pereira", "Lima", "Costa", "Ribeiro", "Almeida", "Conceição"]
+
+
+def gerar_socios(n, semente=0):
+    """Cadastro com n sócios de nomes únicos e telefones em formatos variados."""
+    rng = np.random.default_rng(semente)
+    nomes = [f"{NOMES[i % len(NOMES)]} {SOBRENOMES[(i // len(NOMES)) % len(SOBRENOMES)]} {i}" for i in range(n)]
+    telefones = [f"(95) 9{t // 10000:04d}-{t % 10000:04d}" for t in rng.integers(0, 10 ** 8, n)]
+    return pd.DataFrame({
+        "Nome": nomes,
+        "Telefone": telefones,
+        "Status": rng.choice(["Ativo", "Inativo"], n, p=[0.9, 0.1]),
+        "Email": [f"socio{i}@email.com" for i in range(n)],
+    })
+
+
+def gerar_livro(n, socios=None, semente=0, inicio="2020-01-01", dias=5 * 365):
+    """Livro com n lançamentos espalhados em `dias` dias, nas colunas de COLUNAS_FINANCEIRO."""
+    rng = np.random.default_rng(semente)
+    socios = gerar_socios(1000, semente) if socios is None else socios
+    tipos = rng.choice(["Entrada", "Saída"], n, p=[0.6, 0.4])
+    entrada = tipos == "Entrada"
+    indices_cat = rng.integers(0, 6, n)
+    categorias = np.where(entrada, np.array(CATEGORIAS["Entrada"])[indices_cat], np.array(CATEGORIAS["Saída"])[indices_cat])
+    datas = pd.Timestamp(inicio) + pd.to_timedelta(np.sort(rng.integers(0, dias, n)), unit="D")
+    nomes_socios = np.append(socios["Nome"].to_numpy(dtype=object), "Não Identificado")
+    return pd.DataFrame({
+        "ID": np.arange(1, n + 1),
+        "Data": datas.strftime("%Y-%m-%d"),
+        "Tipo": tipos,
+        "Conta": rng.choice(CONTAS, n, p=[0.8, 0.2]),
+        "Categoria": categorias,
+        "Centro_Custo": rng.choice(CENTROS_CUSTO, n),
+        "Descrição": [f"{h} {i}" for h, i in zip(rng.choice(HISTORICOS, n), range(n))],
+        "Valor": np.round(rng.lognormal(4, 1, n), 2),
+        "Socio": np.where(entrada, nomes_socios[rng.integers(0, len(nomes_socios), n)], "Não Identificado"),
+        "Conciliado": rng.choice(["Manual", "Sim"], n),
+        "Ref_Extrato": "",
+    })
+
+
+def _movimentos(n, semente, ano):
+    rng = np.random.default_rng(semente)
+    datas = pd.Timestamp(f"{ano}-01-01") + pd.to_timedelta(np.sort(rng.integers(0, 365, n)), unit="D")
+    valores = np.round(rng.lognormal(4, 1, n), 2) * np.where(rng.random(n) < 0.6, 1, -1)
+    historicos = [f"{h} {i}" for h, i in zip(rng.choice(HISTORICOS, n), range(n))]
+    return datas, valores, historicos
+
+
+def gerar_ofx(n, semente=0, conta="12345-6", ano=2024):
+    """Extrato OFX 1.x (SGML) de uma conta com n transações."""
+    datas, valores, historicos = _movimentos(n, semente, ano)
+    linhas = ["OFXHEADER:100", "DATA:OFXSGML", "VERSION:102", "SECURITY:NONE", "ENCODING:USASCII", "CHARSET:1252",
+              "COMPRESSION:NONE", "OLDFILEUID:NONE", "NEWFILEUID:NONE", "", "<OFX>", "<BANKMSGSRSV1>",
+              "<STMTTRNRS><TRNUID>1<STATUS><CODE>0<SEVERITY>INFO</STATUS><STMTRS><CURDEF>BRL",
+              f"<BANKACCTFROM><BANKID>001<ACCTID>{conta}<ACCTTYPE>CHECKING</BANKACCTFROM>",
+              f"<BANKTRANLIST><DTSTART>{ano}0101<DTEND>{ano}1231"]
+    for i, (data, valor, historico) in enumerate(zip(datas.strftime("%Y%m%d"), valores, historicos)):
+        linhas += ["<STMTTRN>", f"<TRNTYPE>{'CREDIT' if valor > 0 else 'DEBIT'}", f"<DTPOSTED>{data}120000[-3:BRT]",
+                   f"<TRNAMT>{valor:.2f}", f"<FITID>{conta}-{i}", f"<MEMO>{historico}", "</STMTTRN>"]
+    linhas += ["</BANKTRANLIST>", "</STMTRS></STMTTRNRS>", "</BANKMSGSRSV1>", "</OFX>"]
+    return "\r\n".join(linhas).encode("latin-1")
+
+
+def _valor_br(valor):
+    return f"{valor:,.2f}".replace(",", "_").replace(".", ",").replace("_", ".")
+
+
+def gerar_pdf_extrato(n, semente=0, ano=2024):
+    """Extrato em PDF com n linhas no formato 'dd/mm/aaaa HISTÓRICO 1.234,56'."""
+    datas, valores, historicos = _movimentos(n, semente, ano)
+    pdf = FPDF()
+    pdf.set_font("Arial", "", 10)
+    pdf.add_page()
+    pdf.cell(0, 8, f"EXTRATO DE CONTA CORRENTE - {ano}", 0, 1)
+    for data, valor, historico in zip(datas.strftime("%d/%m/%Y"), valores, historicos):
+        pdf.cell(0, 6, f"{data} {historico} {_valor_br(valor)}", 0, 1)
+    return pdf.output(dest="S").encode("latin-1")
+
+
+def gerar_csv_extrato(n, semente=0, ano=2024, brasileiro=False, milhar=False):
+    """Extrato em CSV com Data, Descrição e Valor.
+
+    brasileiro=True usa ';', dd/mm/aaaa e vírgula decimal; milhar=True escreve
+    os valores no formato americano com separador de milhar ("-1,234.56").
+    """
+    datas, valores, historicos = _movimentos(n, semente, ano)
+    if brasileiro:
+        df = pd.DataFrame({"Data": datas.strftime("%d/%m/%Y"), "Histórico": historicos, "Valor": [_valor_br(v) for v in valores]})
+        return df.to_csv(index=False, sep=";").encode("utf-8")
+    df = pd.DataFrame({"Data": datas.strftime("%Y-%m-%d"), "Descrição": historicos,
+                       "Valor": [f"{v:,.2f}" for v in valores] if milhar else valores})
+    return df.to_csv(index=False).encode("utf-8")
+
+
+def gerar_xlsx_extrato(n, semente=0, ano=2024):
+    """Extrato .xlsx como os bancos exportam: título, cabeçalho na 3ª linha, datas e valores numéricos e linha de saldo."""
+    datas, valores, historicos = _movimentos(n, semente, ano)
+    livro = openpyxl.Workbook(write_only=True)
+    planilha = livro.create_sheet("Extrato")
+    planilha.append([f"Extrato de conta corrente - {ano}"])
+    planilha.append([])
+    planilha.append(["Data Lançamento", "Histórico", "Documento", "Valor (R$)"])
+    for i, (data, valor, historico) in enumerate(zip(datas.to_pydatetime(), valores, historicos)):
+        planilha.append([data, historico, f"{i:08d}", float(valor)])
+    planilha.append([None, "SALDO ANTERIOR", None, 0.0])
+    destino = BytesIO()
+    livro.save(destino)
+    return destino.getvalue()
@@ -0,0 +1,218 @@
+"""Benchmarks dos caminhos quentes do app.py, com resultado em JSON.
+
+    python benchmarks/executar.py                          # livros de 10k, 100k e 1M lançamentos
+    python benchmarks/executar.py --tamanhos 10000 --saida base.json
+    python benchmarks/executar.py --tamanhos 10000 --comparar base.json
+
+Cada caso é medido `--repeticoes` vezes (tempo mínimo e mediano) e mais uma
+vez sob tracemalloc para o pico de memória. Com --comparar, os casos cuja
+mediana piorou além da tolerância são listados e o comando sai com código 1.
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, datetime
+from functools import partial
+from io import BytesIO
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Modo memória: nada de tesouraria.db; e sem os avisos do Streamlit fora do `streamlit run`.
+os.environ.setdefault("TESOURARIA_DB", "")
+logging.disable(logging.WARNING)
+
+import numpy as np
+import pandas as pd
+
+import app
+import dados
+
+
+def medir(caso, n, funcao, repeticoes, preparar=None, **extras):
+    """Tempo (mínimo e mediana de `repeticoes` execuções) e pico de memória de funcao()."""
+    tempos = []
+    for _ in range(repeticoes):
+        if preparar: preparar()
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append(time.perf_counter() - inicio)
+    if preparar: preparar()
+    tracemalloc.start()
+    funcao()
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    resultado = {"caso": caso, "n": n, "repeticoes": repeticoes, "tempo_min_s": min(tempos),
+                 "tempo_mediana_s": statistics.median(tempos), "pico_memoria_mb": pico / 2 ** 20, **extras}
+    print(f"{caso:<28} n={n:<9} {resultado['tempo_mediana_s']:9.4f} s  {resultado['pico_memoria_mb']:9.1f} MB", file=sys.stderr)
+    return resultado
+
+
+def casos_livro(n, repeticoes, semente):
+    """Carga do livro, agregações do Dashboard/Balancete, filtro e resumos de relatório, PDF do relatório."""
+    socios = dados.gerar_socios(max(1000, n // 100), semente)
+    df = dados.gerar_livro(n, socios, semente)
+    livro = app.LivroCaixa(df)
+    contas = dados.CONTAS
+    saldos = livro.saldos
+    inicio, fim = date(2022, 1, 1), date(2022, 12, 31)
+    motor = livro.relatorios
+    motor.tabela()
+    resultados = [{"caso": "livro_memoria", "n": n, "df_memoria_mb": livro.df.memory_usage(deep=True).sum() / 2 ** 20}]
+
+    def dashboard():
+        saldos.total('Entrada'), saldos.total('Saída')
+        for conta in contas:
+            saldos.total('Entrada', conta) - saldos.total('Saída', conta)
+
+    def balancete():
+        pd.DataFrame([{"Conta": c, "Entradas": saldos.total('Entrada', c), "Saídas": saldos.total('Saída', c)} for c in contas])
+
+    mes = motor.periodo(date(2022, 6, 1), date(2022, 6, 30))
+    resultados += [
+        medir("livro_carga", n, lambda: app.LivroCaixa(df), repeticoes),
+        medir("saldos_reconstruir", n, lambda: app.SaldosAgregados.reconstruir(df), repeticoes),
+        medir("dashboard_totais", n, dashboard, repeticoes),
+        medir("balancete", n, balancete, repeticoes),
+        medir("balancete_tabela", n, saldos.tabela, repeticoes),
+        medir("relatorio_livro_tipado", n, lambda: app.MotorRelatorios(livro).tabela(), repeticoes),
+        medir("relatorio_filtro_periodo", n, lambda: motor.periodo(inicio, fim), repeticoes),
+        medir("consultar_periodo", n, lambda: livro.consultar(inicio=inicio, fim=fim), repeticoes),
+        medir("relatorio_resumo_groupby", n,
+              lambda: motor.periodo(inicio, fim).groupby(['Tipo', 'Categoria'])['Valor'].sum().reset_index(), repeticoes),
+        medir("indice_socios", n, lambda: app.IndiceSocios().atualizar(socios, livro), repeticoes, socios=len(socios)),
+        medir("indice_socios_historico", n, lambda: app.IndiceSocios().atualizar(socios, livro).historico(socios['Nome'].iat[0]),
+              repeticoes, socios=len(socios)),
+        medir("pdf_relatorio", n, lambda: app.gerar_relatorio_pdf(mes, "Relatório Detalhado"), repeticoes, linhas=len(mes)),
+    ]
+    return resultados
+
+
+def casos_fechamento(n, repeticoes, semente):
+    """Carga dos saldos de um LivroSQLite novo, com o histórico aberto e depois fechado até 3 meses antes do fim."""
+    df = dados.gerar_livro(n, semente=semente)
+    with tempfile.TemporaryDirectory() as pasta:
+        banco = app.BancoTesouraria(os.path.join(pasta, "bench.db"))
+        app.LivroSQLite(banco).append_many(df)
+        carregar = lambda: app.LivroSQLite(banco).saldos
+        fechar_ate = (pd.Period(df['Data'].max(), freq='M') - 3).strftime('%Y-%m')
+        resultados = [medir("saldos_sqlite_sem_fechamento", n, carregar, repeticoes)]
+        resultados.append(medir("fechar_periodo", n, lambda: app.LivroSQLite(banco).fechar(fechar_ate), 1,
+                                lambda: app.LivroSQLite(banco).reabrir("0000-00")))
+        resultados.append(medir("saldos_sqlite_com_fechamento", n, carregar, repeticoes, fechado_ate=fechar_ate))
+    return resultados
+
+
+def casos_recibos(repeticoes, semente, quantidade=100):
+    """Recibo único e recibos unificados, sempre com o cache de recibos vazio."""
+    df = dados.gerar_livro(quantidade, semente=semente)
+    df = df.assign(Data=pd.to_datetime(df['Data']).dt.date)
+    linha = df.iloc[0]
+    limpar = app.recursos_centro().recibos.limpar
+    return [
+        medir("pdf_recibo_unico", 1, lambda: app.gerar_recibo_unico_pdf(linha), repeticoes, limpar),
+        medir("pdf_recibos_unificados", quantidade, lambda: app.gerar_recibos_unificados_pdf(df), repeticoes, limpar),
+    ]
+
+
+def _importar_tabela(conteudo, nome):
+    arquivo = BytesIO(conteudo)
+    arquivo.name = nome
+    return app.parse_tabela_extrato(arquivo)
+
+
+def casos_extratos(tamanhos, tamanhos_pdf, repeticoes, semente):
+    """Leitura de extratos OFX, PDF, CSV e Excel como a tela de Conciliação faz, sem o cache de arquivos."""
+    resultados = []
+    for n in tamanhos:
+        ofx = dados.gerar_ofx(n, semente)
+        resultados.append(medir("parse_ofx", n, lambda: app.parse_ofx(BytesIO(ofx)), repeticoes,
+                                app._parse_ofx_em_cache.clear, bytes=len(ofx)))
+        esperado = round(float(dados._movimentos(n, semente, 2024)[1].sum()), 2)
+        for caso, conteudo, nome in [("importar_csv", dados.gerar_csv_extrato(n, semente), "extrato.csv"),
+                                     ("importar_csv_milhar", dados.gerar_csv_extrato(n, semente, milhar=True), "extrato.csv"),
+                                     ("importar_csv_br", dados.gerar_csv_extrato(n, semente, brasileiro=True), "extrato.csv"),
+                                     ("importar_xlsx", dados.gerar_xlsx_extrato(n, semente), "extrato.xlsx")]:
+            resultados.append(medir(caso, n, partial(_importar_tabela, conteudo, nome), repeticoes,
+                                    app._parse_tabela_em_cache.clear, bytes=len(conteudo)))
+            # Leitura errada não é ganho de desempenho: o total importado tem de bater com o gerado.
+            importado = _importar_tabela(conteudo, nome)
+            if len(importado) != n or round(float(importado['Valor'].sum()), 2) != esperado:
+                raise AssertionError(f"{caso} n={n}: {len(importado)} linhas, total {importado['Valor'].sum():.2f} (esperado {esperado:.2f})")
+    for n in tamanhos_pdf:
+        pdf = dados.gerar_pdf_extrato(n, semente)
+        resultados.append(medir("parse_pdf_extrato", n, lambda: app.parse_pdf_extrato(BytesIO(pdf)), repeticoes,
+                                app._parse_pdf_em_cache.clear, bytes=len(pdf)))
+    return resultados
+
+
+def comparar(resultados, base, tolerancia):
+    """Casos cuja mediana ficou mais de `tolerancia` (fração) acima da mesma medida na base."""
+    anteriores = {(r["caso"], r["n"]): r for r in base["resultados"] if "tempo_mediana_s" in r}
+    regressoes = []
+    for r in resultados:
+        anterior = anteriores.get((r["caso"], r["n"]))
+        if anterior is None or "tempo_mediana_s" not in r:
+            continue
+        razao = r["tempo_mediana_s"] / max(anterior["tempo_mediana_s"], 1e-9)
+        if razao > 1 + tolerancia:
+            regressoes.append({"caso": r["caso"], "n": r["n"], "antes_s": anterior["tempo_mediana_s"],
+                               "agora_s": r["tempo_mediana_s"], "razao": razao})
+    return regressoes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tamanhos", type=int, nargs="+", default=[10_000, 100_000, 1_000_000], help="tamanhos do livro")
+    parser.add_argument("--extratos", type=int, nargs="+", default=[1_000, 10_000, 50_000], help="linhas dos extratos OFX/CSV/Excel")
+    parser.add_argument("--extratos-pdf", type=int, nargs="+", default=[500, 5_000], help="linhas dos extratos em PDF")
+    parser.add_argument("--repeticoes", type=int, default=3)
+    parser.add_argument("--semente", type=int, default=42)
+    parser.add_argument("--saida", help="arquivo JSON de saída (padrão: stdout)")
+    parser.add_argument("--comparar", help="JSON de uma execução anterior para apontar regressões")
+    parser.add_argument("--tolerancia", type=float, default=0.25, help="piora aceita na comparação (0.25 = 25%%)")
+    args = parser.parse_args(argv)
+
+    resultados = []
+    for n in args.tamanhos:
+        resultados += casos_livro(n, args.repeticoes, args.semente)
+        resultados += casos_fechamento(n, args.repeticoes, args.semente)
+    resultados += casos_recibos(args.repeticoes, args.semente)
+    resultados += casos_extratos(args.extratos, args.extratos_pdf, args.repeticoes, args.semente)
+
+    saida = {
+        "meta": {
+            "data": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(), "pandas": pd.__version__, "numpy": np.__version__,
+            "plataforma": platform.platform(), "cpus": os.cpu_count(), "semente": args.semente,
+            "repeticoes": args.repeticoes,
+        },
+        "resultados": resultados,
+    }
+    codigo = 0
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as arquivo:
+            saida["regressoes"] = comparar(resultados, json.load(arquivo), args.tolerancia)
+        for r in saida["regressoes"]:
+            print(f"REGRESSÃO {r['caso']} n={r['n']}: {r['antes_s']:.4f} s -> {r['agora_s']:.4f} s ({r['razao']:.2f}x)", file=sys.stderr)
+        codigo = 1 if saida["regressoes"] else 0
+
+    texto = json.dumps(saida, ensure_ascii=False, indent=2)
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as arquivo:
+            arquivo.write(texto)
+    else:
+        print(texto)
+    return codigo
+
+
+if __name__ == "__main__":
+    sys.exit(main())